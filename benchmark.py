@@ -0,0 +1,429 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import numpy as np
+import yaml
+sys.path.insert(0, './src/')
+
+from TicTacToe import BoardState
+from DynamicMCTS import DynamicMCTS
+from FixedMCTS import FixedMCTS
+from mcts import MCTS
+from rollout import RolloutEngine
+from npnetwork import NumpyNetwork, ComparePrecision
+from replay import ReplayBuffer
+
+def _legacySelectAction(mcts, root):
+    """ The selection from before the child statistics were kept in the
+        parent: every call rescans the children in Python.
+    """
+    childPlays = np.zeros(len(root.Children))
+    childWinRates = np.zeros(len(root.Children))
+    for i in range(len(root.Children)):
+        if root.Children[i] is not None:
+            childPlays[i] = root.Children[i].Plays
+            childWinRates[i] = root.Children[i].WinRate()
+    allPlays = sum(childPlays)
+    upperConfidence = childWinRates + mcts.ExplorationRate * root.Priors * np.sqrt(1.0 + allPlays) / (1.0 + childPlays)
+    return np.argmax(upperConfidence)
+
+def _timeSelections(select, root, seconds):
+    selections = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        for _ in range(100):
+            select(root)
+        selections += 100
+    return selections / (time.time() - start)
+
+def BenchmarkSelection(sizes = (3, 5, 7), plays = 500, seconds = 1.0):
+    """ Compares selections per second of the PUCT selection against the
+        old per-call child rescan on a searched root.
+    """
+    results = {}
+    for size in sizes:
+        BoardState.Size = size
+        BoardState.InARow = min(size, 4)
+        np.random.seed(0)
+        for backend in ('object', 'array'):
+            mcts = DynamicMCTS(mcts = {'explorationRate' : 0.85, 'playLimit' : plays, 'treeBackend' : backend})
+            state = BoardState()
+            mcts.FindMove(state, 1)
+            root = mcts.Root
+
+            before = _timeSelections(lambda r: _legacySelectAction(mcts, r), root, seconds)
+            after = _timeSelections(lambda r: mcts._selectAction(r, 1), root, seconds)
+            results[(size, backend)] = (before, after)
+            print('{0}x{0} {1:6} rescan: {2:10.0f}/s  vectorized: {3:10.0f}/s  ({4:.1f}x)'.format(
+                size, backend, before, after, after / before))
+    BoardState.Size = 3
+    BoardState.InARow = 3
+    return results
+
+def _legacyBackProp(leaf, stateValue, playerForValue):
+    """ The backprop from before the search recorded its path: one
+        recursive call per ply, following the Parent links.
+    """
+    leaf.Plays += 1
+    if leaf.Parent is not None:
+        value = stateValue if leaf.Parent.State.Player == playerForValue else 1 - stateValue
+        leaf.Value += value
+        leaf.Parent.UpdateChild(leaf.Action, value)
+        _legacyBackProp(leaf.Parent, stateValue, playerForValue)
+    return
+
+def _timeCalls(call, seconds):
+    calls = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        for _ in range(10):
+            call()
+        calls += 10
+    return calls / (time.time() - start)
+
+def BenchmarkBackProp(sizes = (7, 11, 15), plays = 1000, seconds = 1.0):
+    """ Compares backprops per second of the iterative backprop over the
+        recorded path against the old recursion over the Parent links, on a
+        path through a whole random game, and reports the playouts per
+        second of a DynamicMCTS search on the same board.
+    """
+    results = {}
+    for size in sizes:
+        BoardState.Size = size
+        BoardState.InARow = min(size, 5)
+        np.random.seed(0)
+        mcts = DynamicMCTS(mcts = {'explorationRate' : 0.85, 'playLimit' : plays})
+
+        node = mcts._newRoot(BoardState())
+        path = [(node, None)]
+        action = None
+        while node.State.Winner(action) is None:
+            mcts.AddChildren(node)
+            action = np.random.choice(np.where(node.LegalActions == 1)[0])
+            node = node.Children[action]
+            path.append((node, action))
+        player = node.State.PreviousPlayer
+
+        before = _timeCalls(lambda: _legacyBackProp(node, 1, player), seconds)
+        after = _timeCalls(lambda: mcts.BackProp(path, 1, player), seconds)
+
+        start = time.time()
+        mcts.FindMove(BoardState(), 1)
+        search = plays / (time.time() - start)
+        results[size] = (before, after, search)
+        print('{0}x{0} depth {1:3}  recursive: {2:8.0f}/s  iterative: {3:8.0f}/s  ({4:.1f}x)  search: {5:.0f} playouts/s'.format(
+            size, len(path) - 1, before, after, after / before, search))
+    BoardState.Size = 3
+    BoardState.InARow = 3
+    return results
+
+def BenchmarkRollouts(sizes = (3, 5, 7), leaves = 32, playouts = 16, seconds = 1.0):
+    """ Compares random playouts per second of the one game at a time
+        MCTS.SampleValue against the vectorized RolloutEngine, from a batch
+        of positions a few moves into the game.
+    """
+    results = {}
+    for size in sizes:
+        BoardState.Size = size
+        BoardState.InARow = min(size, 5)
+        np.random.seed(0)
+        states = []
+        for _ in range(leaves):
+            state = BoardState()
+            for _ in range(size):
+                state.ApplyAction(np.random.choice(np.where(state.LegalActions() == 1)[0]))
+            states.append(state)
+        players = [s.PreviousPlayer for s in states]
+
+        mcts = MCTS(0.85)
+        before = leaves * _timeCalls(lambda: [mcts.SampleValue(s, p) for s, p in zip(states, players)], seconds)
+        engine = RolloutEngine.ForState(states[0], playouts)
+        after = leaves * playouts * _timeCalls(lambda: engine.Values(states, players), seconds)
+        results[size] = (before, after)
+        print('{0}x{0} per object: {1:10.0f} playouts/s  vectorized: {2:10.0f} playouts/s  ({3:.1f}x)'.format(
+            size, before, after, after / before))
+    BoardState.Size = 3
+    BoardState.InARow = 3
+    return results
+
+def _timeEvaluations(evaluate, states, seconds):
+    runs = 0
+    start = time.time()
+    while time.time() - start < seconds:
+        evaluate(states)
+        runs += 1
+    return (time.time() - start) / runs
+
+def BenchmarkNumpyInference(batchSizes = (1, 8, 32, 128), seconds = 1.0, tolerance = 1e-4):
+    """ Checks that the NumPy network matches the TF network on random
+        boards, and compares their latency per batch.
+    """
+    from network import Network
+    with open('parameters_template.yaml') as param_file:
+        parameters = yaml.load(param_file.read().strip())
+    network = Network(False, False, **parameters)
+    numpyNetwork = NumpyNetwork(network.parameters['blocks'], network.dims)
+    numpyNetwork.SetWeights(network.getWeights(numpyNetwork.Names()))
+
+    def tfForward(states):
+        return network.sess.run([network.evaluation, network.policy_base], feed_dict={network.input:states})
+
+    np.random.seed(0)
+    results = {}
+    for batchSize in batchSizes:
+        states = np.random.randint(0, 2, (batchSize,) + network.dims + (3,)).astype(np.float32)
+        (tfValues, tfPolicies) = tfForward(states)
+        (npValues, npPolicies) = numpyNetwork.Forward(states)
+        error = max(np.max(np.abs(tfValues - npValues)), np.max(np.abs(tfPolicies - npPolicies)))
+        assert error < tolerance, 'NumPy and TF outputs differ by {}'.format(error)
+
+        before = _timeEvaluations(tfForward, states, seconds)
+        after = _timeEvaluations(numpyNetwork.Forward, states, seconds)
+        results[batchSize] = (before, after)
+        print('batch {0:4} tf: {1:8.3f}ms  numpy: {2:8.3f}ms  ({3:.1f}x, max error {4:.1e})'.format(
+            batchSize, 1000 * before, 1000 * after, before / after, error))
+    return results
+
+def _seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    return
+
+def _newGraph(seed):
+    """ Fresh default graph with a fixed seed, so every workload starts from
+        the same initial weights.
+    """
+    import tensorflow as tf
+    tf.reset_default_graph()
+    tf.set_random_seed(seed)
+    _seed(seed)
+    return
+
+def _metric(runs, unit, higherIsBetter = True):
+    return {'value' : float(np.median(runs)), 'runs' : [float(r) for r in runs],
+            'unit' : unit, 'higher_is_better' : higherIsBetter}
+
+def SuiteSearch(seed, repeats, plays = 400):
+    """ Playouts per second of FixedMCTS and DynamicMCTS with random
+        rollouts, searching every move of one seeded game.
+    """
+    metrics = {}
+    workloads = [(cls, size, inARow, rollouts)
+                 for cls in (DynamicMCTS, FixedMCTS) for (size, inARow) in ((3, 3), (5, 4)) for rollouts in (None, 16)]
+    for (cls, size, inARow, rollouts) in workloads:
+        BoardState.Size = size
+        BoardState.InARow = inARow
+        runs = []
+        for _ in range(repeats):
+            _seed(seed)
+            mcts = cls(mcts = {'explorationRate' : 0.85, 'playLimit' : plays, 'maxDepth' : 10, 'rollouts' : rollouts})
+            state = BoardState()
+            moves = 0
+            start = time.time()
+            while state.Winner() is None and np.any(state.LegalActions()):
+                (state, *_) = mcts.FindMove(state, 1)
+                mcts.AdvanceRoot([mcts.LastAction])
+                moves += 1
+            runs.append(moves * plays / (time.time() - start))
+        name = 'search/{0}/{1}x{1}/{2}'.format(cls.__name__, size, 'rollouts_{}'.format(rollouts) if rollouts else 'random_game')
+        metrics[name] = _metric(runs, 'playouts/s')
+    BoardState.Size = 3
+    BoardState.InARow = 3
+    return metrics
+
+def SuiteNetwork(parameters, seed, repeats, batchSizes = (1, 8, 32, 128), calls = 50, steps = 50):
+    """ Latency per batch of the TF network and its NumPy copy, and training
+        steps per second, on seeded random boards.
+    """
+    from network import Network
+    _newGraph(seed)
+    network = Network(False, False, **parameters)
+    numpyNetwork = NumpyNetwork(network.parameters['blocks'], network.dims)
+    numpyNetwork.SetWeights(network.getWeights(numpyNetwork.Names()))
+
+    metrics = {}
+    for batchSize in batchSizes:
+        states = np.random.randint(0, 2, (batchSize,) + network.dims + (3,)).astype(np.float32)
+        for backend, evaluate in (('tf', network.getEvaluationAndPolicy), ('numpy', numpyNetwork.getEvaluationAndPolicy)):
+            evaluate(states) # The first TF run sets up the session.
+            runs = []
+            for _ in range(repeats):
+                start = time.time()
+                for _ in range(calls):
+                    evaluate(states)
+                runs.append(1000 * (time.time() - start) / calls)
+            metrics['inference/{0}/batch_{1}'.format(backend, batchSize)] = _metric(runs, 'ms', False)
+
+    batchSize = parameters.get('network').get('training').get('batch_size')
+    learningRate = parameters.get('network').get('training').get('learning_rate')
+    states = np.random.randint(0, 2, (batchSize,) + network.dims + (3,)).astype(np.float32)
+    evaluations = np.random.uniform(-1, 1, batchSize).astype(np.float32)
+    policies = np.random.dirichlet(np.ones(network.dims[0] * network.dims[1]), batchSize).astype(np.float32)
+    network.train(states, evaluations, policies, learningRate)
+    runs = []
+    for _ in range(repeats):
+        start = time.time()
+        for _ in range(steps):
+            network.train(states, evaluations, policies, learningRate)
+        runs.append(steps / (time.time() - start))
+    metrics['training/batch_{}/steps_per_sec'.format(batchSize)] = _metric(runs, 'steps/s')
+    return metrics
+
+def SuitePrecision(parameters, seed, repeats, batchSizes = (1, 8, 32), calls = 50, positions = 256):
+    """ Output error, weight memory and latency per batch of the reduced
+        precision NumPy networks against full precision, with seeded
+        weights, calibrated on positions from seeded random games.
+    """
+    from network import Network
+    _newGraph(seed)
+    network = Network(False, False, **parameters)
+    full = NumpyNetwork(network.parameters['blocks'], network.dims)
+    full.SetWeights(network.getWeights(full.Names()))
+
+    boards = []
+    while len(boards) < positions:
+        state = BoardState(network.dims[0])
+        while state.Winner() is None and len(boards) < positions:
+            boards.append(state.AsInputArray()[0])
+            state.ApplyAction(np.random.choice(np.flatnonzero(state.LegalActions())))
+    states = np.stack(boards)
+
+    metrics = {}
+    report = ComparePrecision(full, states)
+    for precision in sorted(report):
+        reduced = NumpyNetwork(full.Blocks, full.Dims)
+        reduced.SetPrecision(precision, states)
+        reduced.SetWeights(full.Weights)
+        # Full precision only reports its memory, the errors are measured against it.
+        for key, unit, higherIsBetter in (('bytes', 'bytes', False), ('value_max_error', '', False),
+                                          ('policy_kl', '', False), ('top_move_agreement', '', True)):
+            if key in report[precision]:
+                metrics['precision/{0}/{1}'.format(precision, key)] = _metric([report[precision][key]], unit, higherIsBetter)
+        for batchSize in batchSizes:
+            runs = []
+            for _ in range(repeats):
+                start = time.time()
+                for _ in range(calls):
+                    reduced.Forward(states[:batchSize])
+                runs.append(1000 * (time.time() - start) / calls)
+            metrics['precision/{0}/batch_{1}'.format(precision, batchSize)] = _metric(runs, 'ms', False)
+    return metrics
+
+def SuiteSelfPlay(parameters, seed, repeats, games = 4):
+    """ Self-play games per minute of BlackBird.GenerateTrainingSamples with
+        freshly initialized, seeded weights.
+    """
+    from blackbird import BlackBird
+    temp = parameters.get('mcts').get('temperature').get('exploration')
+    runs = []
+    for _ in range(repeats):
+        _newGraph(seed)
+        player = BlackBird(saver=False, tfLog=False, loadOld=False, **parameters)
+        start = time.time()
+        player.GenerateTrainingSamples(games, temp)
+        runs.append(60 * games / (time.time() - start))
+        del player
+    return {'selfplay/games_per_min' : _metric(runs, 'games/min')}
+
+Suites = ('search', 'network', 'precision', 'selfplay')
+
+def RunSuite(parametersFile = 'parameters_template.yaml', suites = Suites, seed = 0, repeats = 3):
+    """ Runs the seeded workloads and returns their metrics, each the median
+        of repeats runs, with a description of the machine and the code.
+    """
+    with open(parametersFile) as param_file:
+        parameters = yaml.load(param_file.read().strip())
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    results = {
+        'meta' : {
+            'time' : time.time(),
+            'commit' : commit,
+            'seed' : seed,
+            'repeats' : repeats,
+            'parameters' : parametersFile,
+            'python' : platform.python_version(),
+            'numpy' : np.__version__,
+            'machine' : platform.platform(),
+            'processor' : platform.processor()
+            },
+        'metrics' : {}
+        }
+    for suite in suites:
+        if suite == 'search':
+            metrics = SuiteSearch(seed, repeats)
+        elif suite == 'network':
+            metrics = SuiteNetwork(parameters, seed, repeats)
+        elif suite == 'precision':
+            metrics = SuitePrecision(parameters, seed, repeats)
+        elif suite == 'selfplay':
+            metrics = SuiteSelfPlay(parameters, seed, repeats)
+        else:
+            raise ValueError('Unknown benchmark suite {}'.format(suite))
+        for name, metric in sorted(metrics.items()):
+            print('{0:45} {1:12.3f} {2}'.format(name, metric['value'], metric['unit']))
+        results['metrics'].update(metrics)
+    return results
+
+def Compare(baseline, current, threshold = 0.1):
+    """ Compares the metrics of two runs of RunSuite. A metric regresses when
+        it is more than threshold (relative) worse than in baseline. Returns
+        the names of the regressed metrics.
+    """
+    regressions = []
+    for name in sorted(set(baseline['metrics']) | set(current['metrics'])):
+        if name not in baseline['metrics'] or name not in current['metrics']:
+            print('{0:45} only in {1}'.format(name, 'baseline' if name in baseline['metrics'] else 'current'))
+            continue
+        before = baseline['metrics'][name]
+        after = current['metrics'][name]
+        change = (after['value'] - before['value']) / before['value'] if before['value'] != 0 else 0
+        worse = -change if before['higher_is_better'] else change
+        regressed = worse > threshold
+        if regressed:
+            regressions.append(name)
+        print('{0:45} {1:12.3f} -> {2:12.3f} {3:8} {4:+7.1%}{5}'.format(
+            name, before['value'], after['value'], after['unit'], change, '  REGRESSION' if regressed else ''))
+    if baseline['meta'].get('machine') != current['meta'].get('machine'):
+        print('The runs are from different machines, {} and {}.'.format(baseline['meta'].get('machine'), current['meta'].get('machine')))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Without a command, runs the micro benchmarks of the search and inference.')
+    commands = parser.add_subparsers(dest = 'command')
+    suite = commands.add_parser('suite', help = 'Run the seeded workloads and write their metrics to a JSON file.')
+    suite.add_argument('--output', default = 'benchmark.json')
+    suite.add_argument('--parameters', default = 'parameters_template.yaml')
+    suite.add_argument('--suites', nargs = '+', choices = Suites, default = list(Suites))
+    suite.add_argument('--seed', type = int, default = 0)
+    suite.add_argument('--repeats', type = int, default = 3)
+    compare = commands.add_parser('compare', help = 'Flag the metrics that regressed between two suite runs.')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type = float, default = 0.1, help = 'Relative change that counts as a regression.')
+    args = parser.parse_args()
+
+    if args.command == 'suite':
+        results = RunSuite(args.parameters, args.suites, args.seed, args.repeats)
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent = 2, sort_keys = True)
+    elif args.command == 'compare':
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        with open(args.current) as f:
+            current = json.load(f)
+        regressions = Compare(baseline, current, args.threshold)
+        print('{} regressions'.format(len(regressions)))
+        sys.exit(1 if regressions else 0)
+    else:
+        BenchmarkSelection()
+        BenchmarkBackProp()
+        BenchmarkRollouts()
+        BenchmarkNumpyInference()
@@ -3,10 +3,14 @@ import sys
 import yaml
 sys.path.insert(0, './src/')
 
-from blackbird import BlackBird
-from TicTacToe import BoardState
+from replay import ReplayBuffer
+from pipeline import Pipeline
+from arena import Promote
 
 def main():
+    # Imported here, spawned workers import this module again and should not load TF.
+    from blackbird import BlackBird
+
     assert os.path.isfile('parameters.yaml'), 'Copy the parameters_template.yaml file into parameters.yaml to test runs.'
     with open('parameters.yaml') as param_file:
         parameters = yaml.load(param_file.read().strip())
@@ -20,12 +24,29 @@ def main():
     BlackbirdInstance = BlackBird(saver=True, tfLog=True,
                                   loadOld=True, **parameters)
 
+    if (parameters.get('pipeline') or {}).get('enabled'):
+        # loadOld has written the best model if there was none, the stages load it from disk.
+        del BlackbirdInstance
+        Pipeline(parameters).Run()
+        return
+
+    Replay = None
+    if TrainingParameters.get('replay_dir') is not None:
+        Replay = ReplayBuffer(TrainingParameters.get('replay_dir'),
+                              TrainingParameters.get('replay_window'))
+
     for epoch in range(1, TrainingParameters.get('epochs') + 1):
         print('Starting epoch {0}...'.format(epoch))
         nGames = parameters.get('selfplay').get('training_games')
         examples = BlackbirdInstance.GenerateTrainingSamples(
             nGames,
             parameters.get('mcts').get('temperature').get('exploration'))
+        if Replay is not None:
+            Replay.Append(examples)
+            examples = Replay
+        cacheStats = BlackbirdInstance.EvalCache.ResetStats()
+        print('Evaluation cache: {0} hits, {1} misses, {2} evictions ({3:.1%} hit rate)'.format(
+            cacheStats['hits'], cacheStats['misses'], cacheStats['evictions'], cacheStats['hit_rate']))
         BlackbirdInstance.LearnFromExamples(examples)
         print('Finished training for this epoch!')
 
@@ -45,9 +66,17 @@ def main():
         print('Draws = {0}'.format(draws))
         print('Losses = {0}'.format(losses))
 
+        searchStats = BlackbirdInstance.ExportSearchStats(epoch)
+        if searchStats is not None:
+            phases = searchStats['phases']
+            print('Search: {0:.0f} playouts/s, {1:.0f} nodes ({2:.0f} reused) and depth {3} per move, {4:.1%} cache hits'.format(
+                searchStats['playouts_per_sec'], searchStats['tree_nodes'], searchStats['reused_nodes'],
+                searchStats['max_depth'], searchStats['cache_hit_rate']))
+            print('Mean latency: ' + ', '.join('{0} {1:.3f}ms'.format(p, 1000 * phases[p]['mean']) for p in sorted(phases)))
+
         print('\n')
 
-        if wins > losses:
+        if Promote(BlackbirdInstance.ArenaDecision, wins, losses):
             BlackbirdInstance.saveModel()
 
 if __name__ == '__main__':
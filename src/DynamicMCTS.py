@@ -10,18 +10,20 @@ class DynamicMCTS(MCTS):
         return super().__init__(**params, **kwargs)
     
     # Overriding from MCTS
-    def FindLeaf(self, node, temp):
+    def FindLeaf(self, node, temp, path=None):
+        if path is None:
+            path = []
         lastAction = None
+        path.append((node, None))
         while True:
             if node.Children is None:
-                if node.State.Winner(lastAction) is not None:
-                    break
-                self.AddChildren(node)
+                # Expanded by the search once the leaf has been evaluated.
                 break
             if np.sum(node.LegalActions) == 0:
                 break
             lastAction = self._selectAction(node, temp)
             node = node.Children[lastAction]
+            path.append((node, lastAction))
             
         return node
 
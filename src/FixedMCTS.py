@@ -5,6 +5,8 @@ class FixedMCTS(MCTS):
     """ An implementation of Monte Carlo Tree Search that only aggregates 
         statistics up to a fixed depth.
     """
+    ExpandLeaf = False # The nodes above MaxDepth are expanded on the way down, the leaves never.
+
     def __init__(self, **kwargs):
         self.parameters = kwargs.get('mcts')
         self.MaxDepth = self.parameters.get('maxDepth')
@@ -13,14 +15,28 @@ class FixedMCTS(MCTS):
         playLimit = self.parameters.get('playLimit')
         threads = self.parameters.get('threads')
         if threads is None: threads =1 
+        treeBackend = self.parameters.get('treeBackend')
+        treeChunk = self.parameters.get('treeChunk', 4096)
+        batchSize = self.parameters.get('batchSize', 1)
+        batchTimeout = self.parameters.get('batchTimeout')
+        parallelMode = self.parameters.get('parallelMode')
+        virtualLoss = self.parameters.get('virtualLoss', 1)
+        transpositions = self.parameters.get('transpositions')
+        reuseLimit = self.parameters.get('reuseLimit')
+        rollouts = self.parameters.get('rollouts')
+        instrument = self.parameters.get('instrument', False)
 
         assert self.MaxDepth > 0, 'MaxDepth for MCTS must be > 0.'
 
-        super().__init__(explorationRate, timeLimit, playLimit, threads)
+        super().__init__(explorationRate, timeLimit, playLimit, threads, treeBackend, treeChunk, batchSize, batchTimeout,
+            parallelMode, virtualLoss, transpositions, reuseLimit, rollouts, instrument)
     
     # Overriding from MCTS
-    def FindLeaf(self, node, temp):
+    def FindLeaf(self, node, temp, path=None):
+        if path is None:
+            path = []
         lastAction = None
+        path.append((node, None))
         for i in range(self.MaxDepth):
             if node.Children is None:
                 if node.State.Winner(lastAction) is not None:
@@ -30,6 +46,7 @@ class FixedMCTS(MCTS):
                 break
             lastAction = self._selectAction(node, temp)
             node = node.Children[lastAction]
+            path.append((node, lastAction))
         assert lastAction is not None, 'When requesting a move from the MCTS, there is at least one legal option.'
             
         return node
@@ -1,11 +1,14 @@
-import pickle
 from blackbird import BlackBird
+from mcts import MCTS
+from replay import ReplayBuffer
 import yaml
 import numpy as np
 
 class JustTakeThatOneFunction(BlackBird):
     def __init__(self, parameters):
-        return super().__init__(**parameters)
+        super().__init__(**parameters)
+        if self.Rollouts is None:
+            self.Rollouts = 1 # One random game per leaf, but played together with the other leaves of a batch.
 
     # Just copied from the default implementation of MCTS
     def GetPriors(self, state):
@@ -15,24 +18,21 @@ class JustTakeThatOneFunction(BlackBird):
         return np.array([1] * len(state.LegalActions()))
 
     def SampleValue(self, state, player):
-        """Samples the value of the state for the specified player.
-            Must return the value in [0, 1]
-            Default is to randomly playout the game.
+        """ Random rollouts like the default implementation of MCTS.
         """
-        rolloutState = state
-        winner = rolloutState.Winner()
-        while winner is None:
-            actions = np.where(rolloutState.LegalActions() == 1)[0]
-            action = np.random.choice(actions)
-            rolloutState = self._applyAction(rolloutState, action)
-            winner = rolloutState.Winner(action)
-        return 0.5 if winner == 0 else int(player == winner)
+        return MCTS.SampleValue(self, state, player)
+
+    def SampleValues(self, states, players):
+        return MCTS.SampleValues(self, states, players)
+
+    def SampleValuesAndPriors(self, states, players):
+        return MCTS.SampleValuesAndPriors(self, states, players)
 
 if __name__ == '__main__':
     with open('parameters.yaml', 'r') as param_file:
         parameters = yaml.load(param_file)
     ai = JustTakeThatOneFunction(parameters)
 
-    examples = ai.GenerateTrainingSamples(500)
-    with open('goodGames.txt', 'bw') as goodGames:
-        pickle.dump(examples, goodGames)
+    examples = ai.GenerateTrainingSamples(500,
+        parameters.get('mcts').get('temperature').get('exploration'))
+    ReplayBuffer('goodGames').Append(examples)
@@ -1,39 +1,73 @@
 from FixedMCTS import FixedMCTS
 from DynamicMCTS import DynamicMCTS
 from GameState import GameState
+from symmetry import Permutations
 import numpy as np
+import random
 
 class BoardState(GameState):
+    """ k-in-a-row board stored as one integer bitboard per player, where bit
+        i is set if the player has a stone on cell i. The bitboards are never
+        modified in place, so copies are cheap, and a Zobrist hash of the
+        position is kept up to date by ApplyAction.
+
+        Every state has its own Size and InARow, the class attributes are
+        only the defaults for states created without them.
+    """
     Players = {0: ' ', 1 : 'X', 2 : 'O'}
     Size = 3
     InARow = 3
     Dirs = [(0,1),(1,1),(1,0),(1,-1)]
 
-    def __init__(self):
-        self.Board = np.zeros((self.Size,self.Size,2))
+    _geometries = {}
+
+    def __init__(self, size = None, inARow = None):
+        self.Size = size if size is not None else BoardState.Size
+        self.InARow = inARow if inARow is not None else BoardState.InARow
+        self.Bits = (0, 0) # (X stones, O stones)
+        self.Hash = 0
         self.Player = 1
         self.PreviousPlayer = None
+        self._legal = None
         return 
 
     def Copy(self):
-        copy = BoardState()
+        copy = BoardState(self.Size, self.InARow)
+        copy.Bits = self.Bits
+        copy.Hash = self.Hash
         copy.Player = self.Player
-        copy.Board = np.copy(self.Board)
+        copy.PreviousPlayer = self.PreviousPlayer
+        copy._legal = self._legal
         return copy
 
-    def LegalActions(self):
-        actions = np.zeros(self.Size * self.Size)
-        for i in range(self.Size):
-            for j in range(self.Size):
-                if np.sum(self.Board[i, j, :]) == 0:
-                    actions[self._coordsToIndex((i,j))] = 1
+    @property
+    def Board(self):
+        """ The board as (Size, Size, 2) planes, one per player.
+        """
+        board = np.zeros((self.Size, self.Size, 2))
+        board[:, :, 0] = self._unpack(self.Bits[0]).reshape((self.Size, self.Size))
+        board[:, :, 1] = self._unpack(self.Bits[1]).reshape((self.Size, self.Size))
+        return board
 
-        return actions
+    def LegalActions(self):
+        """ Returns a read only array with 1 for every empty cell.
+        """
+        if self._legal is None:
+            self._legal = 1.0 - self._unpack(self.Bits[0] | self.Bits[1])
+            self._legal.flags.writeable = False
+        return self._legal
 
     def ApplyAction(self, action):
-        coords = self._indexToCoords(action)
-        assert np.sum(self.Board[coords[0], coords[1], :]) == 0, 'Ahh. Can\'t go there! {}'.format(action)
-        self.Board[coords[0], coords[1], self.Player - 1] = 1
+        action = int(action)
+        bit = 1 << action
+        assert not (self.Bits[0] | self.Bits[1]) & bit, 'Ahh. Can\'t go there! {}'.format(action)
+        geometry = self._geometry()
+        if self.Player == 1:
+            self.Bits = (self.Bits[0] | bit, self.Bits[1])
+        else:
+            self.Bits = (self.Bits[0], self.Bits[1] | bit)
+        self.Hash ^= geometry.Keys[self.Player - 1][action] ^ geometry.PlayerKey
+        self._legal = None
         self.PreviousPlayer = self.Player
         self.Player = 1 if self.Player == 2 else 2
         return
@@ -46,44 +80,82 @@ class BoardState(GameState):
         return array
 
     def Winner(self, prevAction = None):
-        board = self._collapsed()
+        geometry = self._geometry()
 
         if prevAction is not None:
-            coords = self._indexToCoords(prevAction)
-            win = self._checkVictory(board, coords[0], coords[1])
-            if win is not None: 
-                return win
+            prevAction = int(prevAction)
+            for p in (1, 2):
+                bits = self.Bits[p - 1]
+                if bits >> prevAction & 1:
+                    for line in geometry.CellLines[prevAction]:
+                        if bits & line == line:
+                            return p
         else:
-            for i in range(self.Size):
-                for j in range(self.Size):
-                    if board[i,j] == 0:
-                        continue
-                    win = self._checkVictory(board, i, j)
-                    if win is not None: 
-                        return win
+            for p in (1, 2):
+                bits = self.Bits[p - 1]
+                for line in geometry.Lines:
+                    if bits & line == line:
+                        return p
 
-        if self._isOver(board):
+        if self._isOver():
             return 0
         return None
 
-    def _isOver(self, board):
-        return np.sum(board > 0) == self.Size * self.Size
-
-    def _checkVictory(self, board, i, j):
-        p = board[i,j]
-        for dir in self.Dirs:
-            inARow = 0
-            r = 0
-            while r*dir[0] + i < self.Size and r*dir[1] + j < self.Size and r*dir[1] + j >= 0 and board[r*dir[0] + i, r*dir[1] + j] == p:
-                inARow += 1
-                r += 1
-            r = -1
-            while r*dir[0] + i >= 0 and r*dir[1] + j < self.Size and r*dir[1] + j >= 0 and board[r*dir[0] + i, r*dir[1] + j] == p:
-                inARow += 1
-                r -= 1
-            if inARow >= self.InARow:
-                return p
-        return None
+    def Canonical(self):
+        """ Returns (canonical state, transform) where the canonical state is
+            the same for all 8 symmetric versions of this position and equals
+            this state after symmetry transform number transform.
+        """
+        cells = (self._unpack(self.Bits[0]) + 2 * self._unpack(self.Bits[1])).astype(np.int8)
+        candidates = cells[Permutations(self.Size)]
+        transform = min(range(len(candidates)), key = lambda t: candidates[t].tobytes())
+        if transform == 0 or (candidates[transform] == cells).all():
+            return self, 0
+
+        geometry = self._geometry()
+        canonical = self.Copy()
+        x = candidates[transform] == 1
+        o = candidates[transform] == 2
+        canonical.Bits = (self._pack(x), self._pack(o))
+        canonical.Hash = int(np.bitwise_xor.reduce(geometry.KeyArrays[0][x])) \
+            ^ int(np.bitwise_xor.reduce(geometry.KeyArrays[1][o])) \
+            ^ (geometry.PlayerKey if self.Player == 2 else 0)
+        canonical._legal = None
+        return canonical, transform
+
+    def LineCells(self):
+        """ The cells of every winning line as a (lines, InARow) array.
+        """
+        return self._geometry().LineCells
+
+    def _isOver(self):
+        return self.Bits[0] | self.Bits[1] == self._geometry().Full
+
+    def _unpack(self, bits):
+        """ Converts a bitboard into a float array with one entry per cell.
+        """
+        n = self.Size * self.Size
+        raw = np.frombuffer(bits.to_bytes((n + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(raw).reshape((-1, 8))[:, ::-1].ravel()[:n].astype(np.float64)
+
+    def _pack(self, cells):
+        """ Converts a boolean array with one entry per cell into a bitboard.
+        """
+        n = len(cells)
+        padded = np.zeros(((n + 7) // 8) * 8, dtype=np.uint8)
+        padded[:n] = cells
+        return int.from_bytes(np.packbits(padded.reshape((-1, 8))[:, ::-1]).tobytes(), 'little')
+
+    def _geometry(self):
+        """ Line masks and Zobrist keys for the board size of the state, built
+            once per (Size, InARow) and shared by all states of that size.
+        """
+        key = (self.Size, self.InARow)
+        geometry = BoardState._geometries.get(key)
+        if geometry is None:
+            geometry = _Geometry(self.Size, self.InARow, self.Dirs)
+            BoardState._geometries[key] = geometry
+        return geometry
     
     def _coordsToIndex(self, coords):
         return coords[0]*self.Size + coords[1]
@@ -92,10 +164,7 @@ class BoardState(GameState):
         return (index//self.Size, index % self.Size)
     
     def _collapsed(self):
-        array = np.zeros(self.Board.shape[:2])
-        for p in BoardState.Players:
-            array[self.Board[:, :, p - 1] == 1] = p
-        return array
+        return (self._unpack(self.Bits[0]) + 2 * self._unpack(self.Bits[1])).reshape((self.Size, self.Size))
 
     def __str__(self):
         array = self._collapsed()
@@ -111,12 +180,43 @@ class BoardState(GameState):
         return s
 
     def __eq__(self, other):
-        if other.Player != self.Player:
-            return False
-        return (other.Board == self.Board).all()
+        return other.Hash == self.Hash and other.Player == self.Player and other.Bits == self.Bits \
+            and other.Size == self.Size and other.InARow == self.InARow
 
     def __hash__(self):
-        return "{0}{1}".format(self.Player,str(self)).__hash__()
+        return self.Hash
+
+class _Geometry(object):
+    """ Precomputed bit masks for a Size x Size board with InARow to win.
+    """
+    def __init__(self, size, inARow, dirs):
+        self.Full = (1 << (size * size)) - 1
+        self.Lines = []
+        self.LineCells = []
+        # Lines through each cell, so that checking the last move only looks at O(InARow) lines.
+        self.CellLines = [[] for _ in range(size * size)]
+        for i in range(size):
+            for j in range(size):
+                for dir in dirs:
+                    endI = i + (inARow - 1) * dir[0]
+                    endJ = j + (inARow - 1) * dir[1]
+                    if endI < 0 or endI >= size or endJ < 0 or endJ >= size:
+                        continue
+                    cells = [(i + r * dir[0]) * size + j + r * dir[1] for r in range(inARow)]
+                    line = 0
+                    for cell in cells:
+                        line |= 1 << cell
+                    self.Lines.append(line)
+                    self.LineCells.append(cells)
+                    for cell in cells:
+                        self.CellLines[cell].append(line)
+
+        # Seeded by the board size so that every process hashes positions the same way.
+        rng = random.Random('zobrist {}x{} {}'.format(size, size, inARow))
+        self.Keys = [[rng.getrandbits(64) for _ in range(size * size)] for p in range(2)]
+        self.PlayerKey = rng.getrandbits(64)
+        self.KeyArrays = np.array(self.Keys, dtype=np.uint64)
+        self.LineCells = np.array(self.LineCells, dtype=np.int64).reshape((-1, inARow))
 
 if __name__ == '__main__':
     params = {'mcts' : {'maxDepth' : 10, 'explorationRate' : 1.414, 'playLimit' : 5000}}
@@ -134,7 +234,7 @@ if __name__ == '__main__':
         print('Child Values: {}'.format(player.Root.ChildWinRates()))
         print('Child Exploration Rates: {}'.format(player.Root.ChildPlays()))
         print()
-        player.MoveRoot([state])
+        player.AdvanceRoot([player.LastAction])
     print(state)
     print(state.Winner())
 
@@ -0,0 +1,149 @@
+import math
+import multiprocessing as mp
+import random
+
+class SPRT(object):
+    """ Sequential probability ratio test on game scores (1 win, 0.5 draw,
+        0 loss). H0 is that the candidate scores p0 on average, H1 that it
+        scores p1. alpha and beta are the accepted error rates of wrongly
+        accepting H1 and H0.
+    """
+    def __init__(self, p0 = 0.5, p1 = 0.6, alpha = 0.05, beta = 0.05):
+        assert 0 < p0 < p1 < 1, 'SPRT needs 0 < p0 < p1 < 1.'
+        self.P0 = p0
+        self.P1 = p1
+        self.Lower = math.log(beta / (1 - alpha))
+        self.Upper = math.log((1 - beta) / alpha)
+        self.LLR = 0
+
+    def Update(self, score):
+        """ Adds one game and returns 'H1' once the candidate is better, 'H0'
+            once it is not, and None while the test is undecided.
+        """
+        self.LLR += score * math.log(self.P1 / self.P0) + (1 - score) * math.log((1 - self.P1) / (1 - self.P0))
+        if self.LLR >= self.Upper:
+            return 'H1'
+        if self.LLR <= self.Lower:
+            return 'H0'
+        return None
+
+class Arena(object):
+    """ Plays evaluation games of a candidate checkpoint against the best
+        checkpoint or a random player, in a pool of processes if there is more
+        than one worker. Both are loaded from the .npz weights saved with the
+        checkpoints into NumpyPlayers, so the workers do not import TF. Each
+        worker builds its players once, and their searches evaluate leaves in
+        batches as configured under mcts. With an SPRT the match stops as
+        soon as the test is decided.
+    """
+    def __init__(self, parameters, candidateLoc, bestLoc, workers = 1, sprt = None):
+        self.Parameters = parameters
+        self.CandidateLoc = candidateLoc
+        self.BestLoc = bestLoc
+        self.Workers = workers
+        self.SPRT = sprt
+        self.Decision = None
+
+    def PlayPrevious(self, temp, numGames):
+        return self._play('best', temp, numGames)
+
+    def PlayRandom(self, temp, numGames):
+        return self._play('random', temp, numGames)
+
+    def _play(self, opponent, temp, numGames):
+        """ Returns (wins, draws, losses) of the candidate.
+        """
+        results = {1 : 0, 0.5 : 0, 0 : 0}
+        self.Decision = None
+        sprt = SPRT(**self.SPRT) if self.SPRT is not None else None
+        bestLoc = self.BestLoc if opponent == 'best' else None
+
+        def tally(scores):
+            for score in scores:
+                results[score] += 1
+                if sprt is not None:
+                    self.Decision = sprt.Update(score)
+                    if self.Decision is not None:
+                        return
+
+        if self.Workers <= 1:
+            # A pool of one process would only add the start of a new interpreter and TF.
+            _initArenaWorker(self.Parameters, self.CandidateLoc, bestLoc)
+            try:
+                tally(_playArenaGame(temp) for _ in range(numGames))
+            finally:
+                _releaseArenaWorker()
+        else:
+            context = mp.get_context('spawn') # Forked TF sessions are not usable in the child.
+            with context.Pool(processes = self.Workers, initializer = _initArenaWorker,
+                              initargs = (self.Parameters, self.CandidateLoc, bestLoc)) as pool:
+                # Leaving the pool terminates the games still being played once the test is decided.
+                tally(pool.imap_unordered(_playArenaGame, [temp] * numGames))
+
+        return results[1], results[0.5], results[0]
+
+def Promote(decision, wins, losses):
+    """ Whether a candidate should replace the best model: accepted by the
+        SPRT, or winning more than it loses if no test was decided.
+    """
+    if decision is not None:
+        return decision == 'H1'
+    return wins > losses
+
+# Arena worker process state.
+_candidate = None
+_opponent = None
+
+def _initArenaWorker(parameters, candidateLoc, bestLoc):
+    global _candidate, _opponent
+    from player import NumpyPlayer # The players only search, the worker does not need TF.
+    _candidate = NumpyPlayer(**parameters)
+    _candidate.loadModel(candidateLoc)
+    _opponent = None
+    if bestLoc is not None:
+        _opponent = NumpyPlayer(**parameters)
+        _opponent.loadModel(bestLoc)
+
+def _releaseArenaWorker():
+    """ Drops the players of a match played in this process.
+    """
+    global _candidate, _opponent
+    _candidate = None
+    _opponent = None
+
+def _playArenaGame(temp):
+    """ Plays one game and returns the score of the candidate.
+    """
+    candidateToMove = random.choice([True, False])
+    candidatePlayer = 1 if candidateToMove else 2
+    players = [p for p in (_candidate, _opponent) if p is not None]
+    for p in players:
+        p.DropRoot()
+
+    state = _candidate.NewState()
+    winner = None
+    while winner is None:
+        if candidateToMove:
+            (state, *_) = _candidate.FindMove(state, temp)
+            action = _candidate.LastAction
+        elif _opponent is not None:
+            (state, *_) = _opponent.FindMove(state, temp)
+            action = _opponent.LastAction
+        else:
+            legalMoves = state.LegalActions()
+            action = random.choice([
+                i for i in range(len(legalMoves)) if legalMoves[i] == 1
+                ])
+            state = state.Copy()
+            state.ApplyAction(action)
+        for p in players:
+            p.AdvanceRoot([action])
+
+        candidateToMove = not candidateToMove
+        winner = state.Winner()
+
+    if winner == candidatePlayer:
+        return 1
+    if winner == 0:
+        return 0.5
+    return 0
@@ -0,0 +1,283 @@
+import numpy as np
+
+class ArrayTree(object):
+    """ Flat storage for an MCTS tree. Every node is an id into a set of
+        preallocated NumPy arrays, so expanding a node does not create any
+        Python objects beyond the (lazily built) game states. The children of
+        a node are stored as one contiguous block with one slot per action,
+        which keeps the child statistics of a node in a single array slice.
+    """
+    def __init__(self, chunkSize = 4096):
+        assert chunkSize > 0, 'The tree has to grow by at least one node.'
+        self.ChunkSize = chunkSize
+        self.Capacity = 0
+        self.Count = 0
+        self.ActionCount = None
+
+        self.Visits = np.zeros(0, dtype=np.int32)
+        self.Values = np.zeros(0, dtype=np.float64)
+        self.Priors = np.zeros(0, dtype=np.float32)   # Prior of the edge leading into the node.
+        self.Legal = np.zeros(0, dtype=np.bool_)      # Whether the edge leading into the node is legal.
+        self.Parents = np.zeros(0, dtype=np.int32)
+        self.Actions = np.zeros(0, dtype=np.int32)    # Action taken by the parent to reach the node.
+        self.FirstChild = np.zeros(0, dtype=np.int32) # Offset of the child block, -1 if unexpanded.
+        self.States = []
+        self.StateCount = 0
+
+    _arrays = ('Visits', 'Values', 'Priors', 'Legal', 'Parents', 'Actions', 'FirstChild')
+
+    def Clear(self):
+        """ Forgets every node but keeps the allocated storage for reuse.
+        """
+        self.Count = 0
+        self.States = []
+        self.StateCount = 0
+        return
+
+    def NewRoot(self, state):
+        """ Discards the current tree and starts a new one at the given state.
+        """
+        self.Clear()
+        self.ActionCount = len(state.LegalActions())
+        self._reserve(1)
+        self._initialize(0, 1, -1)
+        self.Legal[0] = True
+        self.Priors[0] = 1
+        self.States.append(state)
+        self.StateCount = 1
+        self.Count = 1
+        return ArrayNode(self, 0)
+
+    def Expand(self, id, legalActions, priors):
+        """ Allocates the child block of a node. Every action gets a slot so
+            that the block lines up with the action indices, illegal actions
+            are marked as such and never materialized.
+        """
+        assert self.FirstChild[id] < 0, 'Node {} is already expanded.'.format(id)
+        n = self.ActionCount
+        self._reserve(n)
+        start = self.Count
+        self._initialize(start, n, id)
+        self.Legal[start : start + n] = np.asarray(legalActions) == 1
+        self.Priors[start : start + n] = np.multiply(priors, legalActions)
+        self.Actions[start : start + n] = np.arange(n)
+        self.States.extend([None] * n)
+        self.FirstChild[id] = start
+        self.Count += n
+        return
+
+    def Reroot(self, id, limit = None):
+        """ Makes node id the root and drops everything outside its subtree.
+            The subtree is copied breadth first to the front of the storage,
+            so the space of the dropped nodes is reused. With a limit, child
+            blocks that would take the subtree past limit nodes are dropped
+            and their parents become leaves again.
+        """
+        self.State(id) # The new root keeps its state, it cannot be rebuilt from a parent.
+        n = self.ActionCount
+        order = [id]
+        parents = [-1]
+        firstChild = []
+        i = 0
+        while i < len(order):
+            start = self.FirstChild[order[i]]
+            if start >= 0 and (limit is None or len(order) + n <= limit):
+                firstChild.append(len(order))
+                order.extend(range(start, start + n))
+                parents.extend([i] * n)
+            else:
+                firstChild.append(-1)
+            i += 1
+
+        old = np.array(order, dtype=np.int64)
+        count = len(order)
+        for name in ('Visits', 'Values', 'Priors', 'Legal', 'Actions'):
+            array = getattr(self, name)
+            array[:count] = array[old]
+        self.Parents[:count] = parents
+        self.FirstChild[:count] = firstChild
+        self.Actions[0] = -1
+        self.Priors[0] = 1
+        self.Legal[0] = True
+
+        self.States = [self.States[o] for o in order]
+        self.StateCount = sum(1 for s in self.States if s is not None)
+        self.Count = count
+        return ArrayNode(self, 0)
+
+    def State(self, id):
+        """ Returns the game state of a node, building it from the parent
+            state on first access.
+        """
+        state = self.States[id]
+        if state is None:
+            state = self.State(self.Parents[id]).Copy()
+            state.ApplyAction(self.Actions[id])
+            self.States[id] = state
+            self.StateCount += 1
+        return state
+
+    def BytesPerNode(self):
+        """ Bytes of array storage used per node, not counting materialized
+            game states.
+        """
+        return sum(getattr(self, name).itemsize for name in self._arrays) + 8 # + a list slot for the state
+
+    def Stats(self):
+        """ nodes only counts the root and the legal children of expanded
+            nodes, like the object backend, slots every allocated one.
+        """
+        return {
+            'nodes' : int(np.count_nonzero(self.Legal[:self.Count])),
+            'slots' : self.Count,
+            'capacity' : self.Capacity,
+            'states' : self.StateCount,
+            'bytes_per_node' : self.BytesPerNode(),
+            'bytes' : self.Capacity * self.BytesPerNode()
+            }
+
+    def _initialize(self, start, n, parent):
+        end = start + n
+        self.Visits[start : end] = 0
+        self.Values[start : end] = 0
+        self.Parents[start : end] = parent
+        self.Actions[start : end] = -1
+        self.FirstChild[start : end] = -1
+        return
+
+    def _reserve(self, n):
+        if self.Count + n <= self.Capacity:
+            return
+        chunks = (self.Count + n - self.Capacity + self.ChunkSize - 1) // self.ChunkSize
+        capacity = self.Capacity + chunks * self.ChunkSize
+        for name in self._arrays:
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.Count] = old[:self.Count]
+            setattr(self, name, new)
+        self.Capacity = capacity
+        return
+
+    def __len__(self):
+        return self.Count
+
+class ArrayNode(object):
+    """ Light view of a node in an ArrayTree that exposes the same interface
+        as mcts.Node. Vectors returned by the child accessors are views into
+        the tree storage, copy them if they need to outlive the search.
+    """
+    __slots__ = ('Tree', 'Id')
+
+    def __init__(self, tree, id):
+        self.Tree = tree
+        self.Id = id
+
+    @property
+    def State(self):
+        return self.Tree.State(self.Id)
+
+    @property
+    def Plays(self):
+        return int(self.Tree.Visits[self.Id])
+
+    @Plays.setter
+    def Plays(self, plays):
+        self.Tree.Visits[self.Id] = plays
+
+    @property
+    def Value(self):
+        return float(self.Tree.Values[self.Id])
+
+    @Value.setter
+    def Value(self, value):
+        self.Tree.Values[self.Id] = value
+
+    @property
+    def Action(self):
+        action = self.Tree.Actions[self.Id]
+        return int(action) if action >= 0 else None
+
+    @property
+    def Parent(self):
+        parent = self.Tree.Parents[self.Id]
+        return ArrayNode(self.Tree, parent) if parent >= 0 else None
+
+    @property
+    def Children(self):
+        start = self.Tree.FirstChild[self.Id]
+        return _ArrayChildren(self.Tree, start) if start >= 0 else None
+
+    @property
+    def LegalActions(self):
+        children = self._childSlice()
+        if children is None:
+            return self.State.LegalActions()
+        return self.Tree.Legal[children]
+
+    @property
+    def Priors(self):
+        children = self._childSlice()
+        if children is None:
+            return np.zeros(self.Tree.ActionCount)
+        return self.Tree.Priors[children]
+
+    def WinRate(self):
+        plays = self.Tree.Visits[self.Id]
+        return self.Tree.Values[self.Id]/plays if plays > 0 else 0
+
+    def ChildProbability(self):
+        plays = self.ChildPlays()
+        allPlays = np.sum(plays)
+        if allPlays > 0:
+            return plays/allPlays
+        legal = self.LegalActions.astype(np.float64)
+        return legal/np.sum(legal) if np.any(legal) else np.zeros(len(plays))
+
+    def ChildWinRates(self):
+        children = self._childSlice()
+        plays = self.Tree.Visits[children]
+        return np.divide(self.Tree.Values[children], plays, out=np.zeros(len(plays)), where=plays > 0)
+
+    def ChildPlays(self):
+        return self.Tree.Visits[self._childSlice()]
+
+    def UpdateChild(self, action, value, plays = 1):
+        """ The child statistics are the children's own visits and values,
+            so there is nothing extra to keep up to date.
+        """
+        return
+
+    def _childSlice(self):
+        start = self.Tree.FirstChild[self.Id]
+        if start < 0:
+            return None
+        return slice(start, start + self.Tree.ActionCount)
+
+    def __eq__(self, other):
+        return isinstance(other, ArrayNode) and other.Tree is self.Tree and other.Id == self.Id
+
+    def __hash__(self):
+        return hash((id(self.Tree), self.Id))
+
+class _ArrayChildren(object):
+    """ Sequence of the children of an ArrayNode, indexed by action. Illegal
+        actions show up as None like in mcts.Node.Children.
+    """
+    __slots__ = ('Tree', 'Start')
+
+    def __init__(self, tree, start):
+        self.Tree = tree
+        self.Start = start
+
+    def __len__(self):
+        return self.Tree.ActionCount
+
+    def __getitem__(self, action):
+        if action < 0 or action >= self.Tree.ActionCount:
+            raise IndexError(action)
+        id = self.Start + action
+        return ArrayNode(self.Tree, id) if self.Tree.Legal[id] else None
+
+    def __iter__(self):
+        for action in range(self.Tree.ActionCount):
+            yield self[action]
@@ -1,97 +1,93 @@
-from DynamicMCTS import DynamicMCTS as MCTS
-from TicTacToe import BoardState
+from player import Player, _initSelfPlayWorker, _playSelfPlayGame
 from network import Network
+from npnetwork import NumpyNetwork, WeightsLoc
+from replay import ReplayBuffer
+from symmetry import AugmentBatch
+from arena import Arena
 
-import functools
+import multiprocessing as mp
+import os
 import random
 import yaml
 import numpy as np
 np.set_printoptions(precision=2)
 
-class BlackBird(MCTS, Network):
+class BlackBird(Player, Network):
     """ Class to train a network using an MCTS driver to improve decision making
     """
-    class TrainingExample(object):
-        def __init__(self, state, value, childValues, probabilities, priors):
-            self.State = state # state holds the player
-            self.Value = value
-            self.ChildValues = childValues.reshape((3,3)) if childValues is not None else None
-            self.Reward = None
-            self.Priors = priors.reshape((3,3))
-            self.Probabilities = probabilities
-            return
-
-        def __str__(self):
-            return '{}\nValue: {}\nChild Values:\n{}\nReward: {}\nProbabilites:\n{}\n\nPriors:\n{}\n'.format(
-                    str(self.State),
-                    str(self.Value),
-                    str(self.ChildValues),
-                    str(self.Reward), 
-                    str(self.Probabilities.reshape((3,3))),
-                    str(self.Priors)
-                    )
-
-    def __init__(self, saver=False, tfLog=False, loadOld=False, **parameters):
-        self.bbParameters = parameters
+    def __init__(self, saver=False, tfLog=False, loadOld=False, frozen=None, **parameters):
         self.batchSize = parameters.get('network').get('training').get('batch_size')
         self.learningRate = parameters.get('network').get('training').get('learning_rate')
-        MCTS.__init__(self, **parameters)
-        Network.__init__(self, saver, tfLog, loadOld=loadOld, **parameters)
+        self.augment = parameters.get('network').get('training').get('augment', False)
+
+        Player.__init__(self, **parameters)
+        Network.__init__(self, saver, tfLog, loadOld=loadOld, frozen=frozen,
+                         dims=(self.BoardSize, self.BoardSize), **parameters)
+
+        self.ArenaDecision = None # SPRT decision of the last evaluation match, None if undecided or not tested.
+
+        self.NumpyInference = None
+        if parameters.get('network').get('backend', 'tf') == 'numpy' and not self.frozen:
+            self.NumpyInference = self._numpyNetwork()
 
     def GenerateTrainingSamples(self, nGames, temp):
         assert nGames > 0, 'Use a positive integer for number of games.'
 
-        examples = []
+        workers = self.bbParameters.get('selfplay').get('workers', 1)
+        if workers is not None and workers > 1:
+            return self._generateParallel(nGames, temp, workers)
 
+        examples = []
         for i in range(nGames):
-            gameHistory = []
-            state = BoardState()
-            lastAction = None
-            winner = None
-            self.DropRoot()
-            while winner is None:
-                (nextState, v, currentProbabilties) = self.FindMove(state, temp)
-                childValues = self.Root.ChildWinRates()
-                example = self.TrainingExample(state, 1 - v, childValues, currentProbabilties, priors = self.Root.Priors)
-                state = nextState
-                self.MoveRoot([state])
-
-                winner = state.Winner(lastAction)
-                gameHistory.append(example)
-                
-            example = self.TrainingExample(state, None, None, np.zeros([len(currentProbabilties)]), np.zeros([len(currentProbabilties)]))
-            gameHistory.append(example)
-            
-            for example in gameHistory:
-                if winner == 0:
-                    example.Reward = 0
-                else:
-                    example.Reward = 1 if example.State.Player == winner else -1
+            examples += self.PlayGame(temp)
+
+        return examples
+
+    def _generateParallel(self, nGames, temp, workers):
+        """ Plays the games in a pool of processes. The current weights are
+            written to a checkpoint that every worker loads once, and the
+            games are collected in the order they finish.
+        """
+        self.saveModel(self.current_loc)
 
-            examples += gameHistory
+        examples = []
+        context = mp.get_context('spawn') # Forked TF sessions are not usable in the child.
+        with context.Pool(processes = workers, initializer = _initSelfPlayWorker,
+                          initargs = (self.bbParameters, self.current_loc)) as pool:
+            for gameHistory in pool.imap_unordered(_playSelfPlayGame, [temp] * nGames):
+                examples += gameHistory
 
         return examples
 
     def LearnFromExamples(self, examples):
-        self.SampleValue.cache_clear()
-        self.GetPriors.cache_clear()
-
-        examples = np.random.choice(examples, 
-                                    len(examples) - (len(examples) % self.batchSize), 
-                                    replace = False)
-                            
-        for i in range(len(examples) // self.batchSize):
-            start = i * self.batchSize
-            batch = examples[start : start + self.batchSize]
-            self.train(
-                    np.stack([b.State.AsInputArray()[0] for b in batch], axis = 0),
-                    np.stack([b.Reward for b in batch], axis = 0),
-                    np.stack([b.Probabilities for b in batch], axis = 0),
-                    self.learningRate
-                    )
+        """ Trains on a list of examples, or on the window of a ReplayBuffer.
+        """
+        if len(examples) < self.batchSize:
+            return
+
+        if isinstance(examples, ReplayBuffer):
+            # Read from the memory mapped shards batch by batch, the window may not fit in memory.
+            self.trainBatches(examples.Batches(self.batchSize), self.learningRate)
+            return
+
+        states = np.stack([e.State.AsInputArray()[0] for e in examples], axis = 0)
+        rewards = np.array([e.Reward for e in examples], dtype = np.float32)
+        probabilities = np.stack([e.Probabilities for e in examples], axis = 0)
+        self.trainDataset(states, rewards, probabilities, self.batchSize, self.learningRate)
+        return
+
+    def _trainBatch(self, states, rewards, probabilities):
+        if self.augment:
+            # Train on all 8 rotations and reflections of the batch.
+            states, rewards, probabilities = AugmentBatch(states, rewards, probabilities)
+        self.train(states, rewards, probabilities, self.learningRate)
         return
 
     def TestRandom(self, temp, numTests):
+        arena = self._arena()
+        if arena is not None:
+            return arena.PlayRandom(temp, numTests)
+
         wins = 0
         draws = 0
         losses = 0
@@ -102,13 +98,13 @@ class BlackBird(MCTS, Network):
             blackbirdPlayer = 1 if blackbirdToMove else 2
             winner = None
             self.DropRoot()
-            state = BoardState()
+            state = self.NewState()
             
             while winner is None:
                 if blackbirdToMove:
                     (nextState, *_) = self.FindMove(state, temp)
                     state = nextState
-                    self.MoveRoot([state])
+                    self.AdvanceRoot([self.LastAction])
 
                 else:
                     legalMoves = state.LegalActions()
@@ -116,7 +112,7 @@ class BlackBird(MCTS, Network):
                         i for i in range(len(legalMoves)) if legalMoves[i] == 1
                         ])
                     state.ApplyAction(move)
-                    self.MoveRoot([state])
+                    self.AdvanceRoot([move])
 
                 blackbirdToMove = not blackbirdToMove
                 winner = state.Winner()
@@ -132,8 +128,18 @@ class BlackBird(MCTS, Network):
         return wins, draws, losses
 
     def TestPrevious(self, temp, numTests):
-        oldBlackbird = BlackBird(saver=False, tfLog=False, loadOld=True,
-            **self.bbParameters)
+        self.ArenaDecision = None
+        arena = self._arena()
+        if arena is not None:
+            results = arena.PlayPrevious(temp, numTests)
+            self.ArenaDecision = arena.Decision
+            return results
+
+        if self._bestLoc() is not None:
+            oldBlackbird = BlackBird(frozen=self._bestLoc(), **self.bbParameters)
+        else:
+            oldBlackbird = BlackBird(saver=False, tfLog=False, loadOld=True,
+                **self.bbParameters)
 
         wins = 0
         draws = 0
@@ -146,20 +152,20 @@ class BlackBird(MCTS, Network):
             winner = None
             self.DropRoot()
             oldBlackbird.DropRoot()
-            state = BoardState()
+            state = self.NewState()
             
             while winner is None:
                 if blackbirdToMove:
                     (nextState, *_) = self.FindMove(state, temp)
                     state = nextState
-                    self.MoveRoot([state])
-                    oldBlackbird.MoveRoot([state])
+                    self.AdvanceRoot([self.LastAction])
+                    oldBlackbird.AdvanceRoot([self.LastAction])
 
                 else:
                     (nextState, *_) = oldBlackbird.FindMove(state, temp)
                     state = nextState
-                    self.MoveRoot([state])
-                    oldBlackbird.MoveRoot([state])
+                    self.AdvanceRoot([oldBlackbird.LastAction])
+                    oldBlackbird.AdvanceRoot([oldBlackbird.LastAction])
 
                 blackbirdToMove = not blackbirdToMove
                 winner = state.Winner()
@@ -175,22 +181,67 @@ class BlackBird(MCTS, Network):
         del oldBlackbird
         return wins, draws, losses
 
-    # Overriden from MCTS
-    @functools.lru_cache(maxsize = 4096)
-    def SampleValue(self, state, player):
-        value = self.getEvaluation(state.AsInputArray()) # Gets the value for the current player.
-        value = (value + 1 ) * 0.5 # [-1, 1] -> [0, 1]
-        if state.Player != player:
-            value = 1 - value
-        assert value >= 0, 'Value: {}'.format(value) # Just to make sure Im not dumb :).
-        return value
-
-    @functools.lru_cache(maxsize = 4096)
-    def GetPriors(self, state):
-        policy = self.getPolicy(state.AsInputArray()) * state.LegalActions()
-        policy /= np.sum(policy)
-        
-        return policy
+    def _arena(self):
+        """ Returns an Arena for the current weights if evaluation games should
+            be played in parallel or stopped early, None otherwise.
+        """
+        parameters = self.bbParameters.get('arena')
+        if parameters is None:
+            return None
+        workers = parameters.get('workers', 1)
+        sprt = parameters.get('sprt')
+        if workers <= 1 and sprt is None:
+            return None # Every game is played, in this process without a checkpoint to save.
+
+        self.saveModel(self.current_loc)
+        return Arena(self.bbParameters, self.current_loc, self.model_loc, workers, sprt)
+
+    def saveModel(self, loc=None):
+        """ Also writes the weights as .npz next to the checkpoint, which
+            NumpyPlayer loads without TF.
+        """
+        Network.saveModel(self, loc)
+        weights = NumpyNetwork(self.parameters['blocks'], self.dims)
+        weights.SetWeights(self.getWeights(weights.Names()))
+        weights.Save(WeightsLoc(loc if loc is not None else self.model_loc))
+        return
+
+    def _bestLoc(self):
+        """ The frozen graph of the best model if it has been exported, which
+            loads much faster than building the network to restore a checkpoint.
+        """
+        return self.frozen_loc if os.path.isfile(self.frozen_loc) else None
+
+    def ExportSearchStats(self, step):
+        """ Writes the search statistics recorded since the last export to the
+            TF summary and to a file in mcts.instrumentDir, and starts a new
+            record. Returns the summary, or None without instrumentation.
+        """
+        if self.Stats is None:
+            return None
+        if self.write_summary:
+            self.Stats.WriteSummary(self.writer, step)
+        mcts = self.bbParameters.get('mcts')
+        directory = mcts.get('instrumentDir')
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+            self.Stats.Save(os.path.join(directory, 'search_{0}.{1}'.format(step, mcts.get('instrumentFormat', 'json'))))
+        summary = self.Stats.Summary()
+        self.Stats.Reset()
+        return summary
+
+    def _inference(self):
+        """ The network to evaluate states with. The NumPy copy is updated
+            from the session whenever the weights have changed since, int8
+            weights on freshly sampled calibration states.
+        """
+        if self.NumpyInference is None:
+            return self
+        version = (self.model_id, self.model_version)
+        if self.NumpyInference.Version != version:
+            self._calibrate(self.NumpyInference)
+            self.NumpyInference.SetWeights(self.getWeights(self.NumpyInference.Names()), version)
+        return self.NumpyInference
 
 if __name__ == '__main__':
     with open('parameters.yaml', 'r') as param_file:
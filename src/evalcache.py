@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+class EvaluationCache(object):
+    """ Fixed capacity cache of network evaluations. Values and policies are
+        kept in preallocated arrays with one slot per entry, and the key of an
+        entry is meant to be (model version, position hash) so that entries of
+        an older model are never returned. Full caches evict either the least
+        recently used entry ('lru') or the first entry the CLOCK hand finds
+        unreferenced ('clock').
+    """
+    def __init__(self, capacity, actions, eviction = 'lru'):
+        assert capacity > 0, 'Cache capacity must be a positive integer.'
+        assert eviction in ('lru', 'clock'), 'Unknown eviction policy {}'.format(eviction)
+        self.Capacity = capacity
+        self.Eviction = eviction
+
+        self.Values = np.zeros(capacity, dtype=np.float32)
+        self.Policies = np.zeros((capacity, actions), dtype=np.float32)
+        self.Keys = [None] * capacity
+        self.Slots = OrderedDict() if eviction == 'lru' else {}
+        self.Referenced = np.zeros(capacity, dtype=np.bool_)
+        self.Hand = 0
+
+        self.Hits = 0
+        self.Misses = 0
+        self.Evictions = 0
+        self._lock = threading.Lock() # Tree parallel search reads and writes from several threads.
+
+    def Get(self, key):
+        """ Returns (value, policy) or None if the key is not cached.
+        """
+        with self._lock:
+            slot = self.Slots.get(key)
+            if slot is None:
+                self.Misses += 1
+                return None
+            self.Hits += 1
+            if self.Eviction == 'lru':
+                self.Slots.move_to_end(key)
+            else:
+                self.Referenced[slot] = True
+            return float(self.Values[slot]), self.Policies[slot].copy()
+
+    def Put(self, key, value, policy):
+        with self._lock:
+            slot = self.Slots.get(key)
+            if slot is None:
+                slot = self._freeSlot()
+                self.Slots[key] = slot
+                self.Keys[slot] = key
+                self.Referenced[slot] = False # New entries only survive the CLOCK hand once they are used.
+            elif self.Eviction == 'lru':
+                self.Slots.move_to_end(key)
+            self.Values[slot] = value
+            self.Policies[slot] = policy
+        return
+
+    def Clear(self):
+        with self._lock:
+            self.Slots.clear()
+            self.Keys = [None] * self.Capacity
+            self.Referenced[:] = False
+            self.Hand = 0
+        return
+
+    def Stats(self):
+        lookups = self.Hits + self.Misses
+        return {
+            'entries' : len(self.Slots),
+            'hits' : self.Hits,
+            'misses' : self.Misses,
+            'evictions' : self.Evictions,
+            'hit_rate' : self.Hits / lookups if lookups > 0 else 0
+            }
+
+    def ResetStats(self):
+        """ Returns the counters so far and starts counting from zero, call it
+            once per epoch.
+        """
+        stats = self.Stats()
+        self.Hits = 0
+        self.Misses = 0
+        self.Evictions = 0
+        return stats
+
+    def _freeSlot(self):
+        if len(self.Slots) < self.Capacity:
+            return len(self.Slots)
+
+        self.Evictions += 1
+        if self.Eviction == 'lru':
+            _, slot = self.Slots.popitem(last = False)
+            return slot
+
+        while self.Referenced[self.Hand]:
+            self.Referenced[self.Hand] = False
+            self.Hand = (self.Hand + 1) % self.Capacity
+        slot = self.Hand
+        self.Hand = (self.Hand + 1) % self.Capacity
+        del self.Slots[self.Keys[slot]]
+        return slot
+
+    def __len__(self):
+        return len(self.Slots)
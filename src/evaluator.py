@@ -0,0 +1,137 @@
+import queue
+import threading
+import time
+
+class EvaluationQueue(object):
+    """ Collects leaves that are waiting for an evaluation so that they can
+        be evaluated together. The queue is ready to be flushed once it holds
+        batchSize leaves, or once timeout seconds have passed since the first
+        leaf was pushed.
+    """
+    def __init__(self, evaluate, batchSize = 1, timeout = None):
+        assert batchSize > 0, 'Batch size must be a positive integer.'
+        self.Evaluate = evaluate # Called with (states, players), returns a (value, priors) pair per state.
+        self.BatchSize = batchSize
+        self.Timeout = timeout
+        self.Leaves = []
+        self.States = []
+        self.Players = []
+        self._leafSet = set()
+        self._firstPush = None
+
+    def Push(self, leaf, state, player):
+        if not self.Leaves:
+            self._firstPush = time.time()
+        self.Leaves.append(leaf)
+        self.States.append(state)
+        self.Players.append(player)
+        self._leafSet.add(leaf)
+        return
+
+    def Ready(self):
+        if len(self.Leaves) >= self.BatchSize:
+            return True
+        return self.Timeout is not None and len(self.Leaves) > 0 and time.time() - self._firstPush >= self.Timeout
+
+    def Flush(self):
+        """ Evaluates every pending leaf in one call and returns the list of
+            (leaf, (value, priors)) pairs in the order they were pushed.
+        """
+        if not self.Leaves:
+            return []
+        evaluations = self.Evaluate(self.States, self.Players)
+        results = list(zip(self.Leaves, evaluations))
+
+        self.Leaves = []
+        self.States = []
+        self.Players = []
+        self._leafSet = set()
+        self._firstPush = None
+        return results
+
+    def __len__(self):
+        return len(self.Leaves)
+
+    def __contains__(self, leaf):
+        return leaf in self._leafSet
+
+class AsyncEvaluator(object):
+    """ Serves the leaf evaluations of several search threads from a single
+        evaluator thread. Requests that arrive together are evaluated as one
+        batch of up to batchSize states, waiting at most timeout seconds for
+        a batch to fill up.
+    """
+    def __init__(self, evaluate, batchSize = 1, timeout = None):
+        assert batchSize > 0, 'Batch size must be a positive integer.'
+        self.Evaluate = evaluate # Called with (states, players), returns a (value, priors) pair per state.
+        self.BatchSize = batchSize
+        self.Timeout = timeout
+        self.Requests = queue.Queue()
+        self._thread = None
+
+    def Start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return
+
+    def Stop(self):
+        if self._thread is not None:
+            self.Requests.put(None)
+            self._thread.join()
+            self._thread = None
+        return
+
+    def Request(self, state, player):
+        """ Blocks until the state has been evaluated and returns its
+            (value, priors).
+        """
+        request = _Request(state, player)
+        self.Requests.put(request)
+        request.Done.wait()
+        if request.Error is not None:
+            raise request.Error
+        return request.Value
+
+    def _run(self):
+        while True:
+            request = self.Requests.get()
+            if request is None:
+                return
+            batch = [request]
+            deadline = time.time() + self.Timeout if self.Timeout is not None else None
+            stop = False
+            while len(batch) < self.BatchSize:
+                try:
+                    if deadline is None:
+                        request = self.Requests.get_nowait()
+                    else:
+                        request = self.Requests.get(timeout=max(0, deadline - time.time()))
+                except queue.Empty:
+                    break
+                if request is None:
+                    stop = True
+                    break
+                batch.append(request)
+
+            try:
+                evaluations = self.Evaluate([r.State for r in batch], [r.Player for r in batch])
+                for r, evaluation in zip(batch, evaluations):
+                    r.Value = evaluation
+            except Exception as e:
+                for r in batch:
+                    r.Error = e
+            for r in batch:
+                r.Done.set()
+
+            if stop:
+                return
+
+class _Request(object):
+    __slots__ = ('State', 'Player', 'Value', 'Error', 'Done')
+
+    def __init__(self, state, player):
+        self.State = state
+        self.Player = player
+        self.Value = None
+        self.Error = None
+        self.Done = threading.Event()
@@ -1,6 +1,10 @@
+import atexit
+import json
+import threading
 import time
 import os
-from pymongo import MongoClient
+import sys
+import numpy as np
 
 def dbLogger(func):
     def f(self, *args, **kwargs):
@@ -12,25 +16,239 @@ def dbLogger(func):
 def canLog(log_file = 'default.txt'):
     """Decorator for enabling something for logging. Should only be used in classes that extend logger"""
     def what_am_I_doing_with_my_life(func):
+        message = ' Logging from {}\n'.format(func.__name__)
         def logEnabled(self, *args, **kwargs):
-            if self.log_dir is not None:
-                fp = os.path.join(self.log_dir, log_file)
-
-                old = self.fout
-                self.fout = self.open_file(fp)
-            
-                self.log('{} Logging from {}'.format(time.time(), func.__name__))
-                val = func(self, *args, **kwargs)
+            if self.log_dir is None:
+                return func(self, *args, **kwargs)
 
-                self.close_file(fp)
-                self.fout = old
-                return val
-            else:
+            writer = self.writers.get(log_file)
+            if writer is None:
+                writer = self._writer(log_file)
+            old = self.fout
+            self.fout = writer
+            writer.write(str(time.time()) + message)
+            try:
                 return func(self, *args, **kwargs)
-            return
+            finally:
+                self.fout = old
         return logEnabled
     return what_am_I_doing_with_my_life
 
+class LogWriter(object):
+    """ A log file that stays open between writes. Writes are buffered and
+        flushed at most flushInterval seconds apart, by the next write or by
+        a timer if none comes, and once the file grows past maxBytes it is
+        rotated to path.1, path.2, ... keeping backups old files. Whatever
+        is still buffered is written on exit.
+    """
+    def __init__(self, path, bufferSize = 65536, flushInterval = 5.0, maxBytes = None, backups = 3):
+        self.Path = path
+        self.BufferSize = bufferSize
+        self.FlushInterval = flushInterval
+        self.MaxBytes = maxBytes
+        self.Backups = backups
+        self.Size = os.path.getsize(path) if os.path.isfile(path) else 0
+        self.LastFlush = time.time()
+        self._lock = threading.Lock()
+        self._timer = None
+        self._file = open(path, 'a', buffering = bufferSize)
+        atexit.register(self.close)
+
+    def write(self, s):
+        with self._lock:
+            self._file.write(s)
+            self.Size += len(s.encode()) # maxBytes counts bytes on disk, not characters.
+            if self.MaxBytes is not None and self.Size >= self.MaxBytes:
+                self._rotate()
+            elif time.time() - self.LastFlush >= self.FlushInterval:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.LastFlush + self.FlushInterval - time.time(), self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._flush()
+        return
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._cancelTimer()
+                self._file.close()
+                self._file = None
+        atexit.unregister(self.close)
+        return
+
+    def _flush(self):
+        self._cancelTimer()
+        self._file.flush()
+        self.LastFlush = time.time()
+        return
+
+    def _cancelTimer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return
+
+    def _rotate(self):
+        self._cancelTimer()
+        self._file.close()
+        if self.Backups > 0:
+            for i in range(self.Backups - 1, 0, -1):
+                older = '{}.{}'.format(self.Path, i)
+                if os.path.isfile(older):
+                    os.replace(older, '{}.{}'.format(self.Path, i + 1))
+            os.replace(self.Path, self.Path + '.1')
+        else:
+            os.remove(self.Path)
+        self._file = open(self.Path, 'a', buffering = self.BufferSize)
+        self.Size = 0
+        self.LastFlush = time.time()
+        return
+
+class DecisionSink(object):
+    """ Buffers documents in memory and writes them from a background thread,
+        with insert_many into a Mongo collection or as JSON lines into a file
+        when there is no database. The thread writes once batchSize documents
+        are waiting or flushInterval seconds have passed. At most maxPending
+        documents are held, after that Put either blocks until the thread
+        has caught up ('block') or drops the document ('drop').
+
+        A batch that cannot be written is counted as failed and reported on
+        stderr, and the error is raised again by the next Flush or Close.
+    """
+    def __init__(self, collection = None, path = None, batchSize = 256, flushInterval = 1.0,
+                 maxPending = 10000, onFull = 'block'):
+        assert collection is not None or path is not None, 'Decisions need a collection or a file to go to.'
+        assert onFull in ('block', 'drop'), 'Unknown back-pressure behaviour {}'.format(onFull)
+        self.Collection = collection
+        self.Path = path
+        self.BatchSize = batchSize
+        self.FlushInterval = flushInterval
+        self.MaxPending = maxPending
+        self.OnFull = onFull
+
+        self.Written = 0
+        self.Dropped = 0
+        self.Failed = 0
+        self.LastError = None
+
+        self._error = None # Raised again by Flush or Close.
+        self._pending = []
+        self._writing = 0
+        self._flush = False
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target = self._run, name = 'decision-sink', daemon = True)
+        self._thread.start()
+
+    def Put(self, document):
+        with self._condition:
+            assert not self._closed, 'The sink has been closed.'
+            while len(self._pending) >= self.MaxPending:
+                if self.OnFull == 'drop':
+                    self.Dropped += 1
+                    return
+                self._condition.wait()
+            self._pending.append(document)
+            if len(self._pending) >= self.BatchSize:
+                self._condition.notify_all()
+        return
+
+    def Flush(self):
+        """ Blocks until every document put so far has been written.
+        """
+        with self._condition:
+            self._flush = True
+            self._condition.notify_all()
+            while self._pending or self._writing:
+                self._condition.wait()
+        self._raise()
+        return
+
+    def Close(self):
+        """ Writes what is pending and stops the thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._raise()
+        return
+
+    def Stats(self):
+        return {
+            'pending' : len(self._pending),
+            'written' : self.Written,
+            'dropped' : self.Dropped,
+            'failed' : self.Failed
+            }
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.time() + self.FlushInterval
+                while not (self._closed or self._flush) and len(self._pending) < self.BatchSize and time.time() < deadline:
+                    self._condition.wait(max(0, deadline - time.time()))
+                batch = self._pending
+                self._pending = []
+                self._flush = False
+                self._writing = len(batch)
+                closed = self._closed
+                self._condition.notify_all() # Room for blocked writers.
+
+            if batch:
+                self._write(batch)
+            with self._condition:
+                self._writing = 0
+                self._condition.notify_all()
+            if closed:
+                return
+
+    def _write(self, batch):
+        try:
+            if self.Collection is not None:
+                self.Collection.insert_many(batch, ordered = False)
+            else:
+                # Serialize the whole batch first, so a bad document does not leave half of it written.
+                lines = [json.dumps(document) + '\n' for document in batch]
+                with open(self.Path, 'a') as f:
+                    f.writelines(lines)
+            self.Written += len(batch)
+        except Exception as e:
+            # The search goes on, the error is raised in the thread that flushes or closes.
+            print('Writing {} decisions failed: {!r}'.format(len(batch), e), file = sys.stderr)
+            with self._condition:
+                self.Failed += len(batch)
+                self.LastError = e
+                self._error = e
+        return
+
+    def _raise(self):
+        with self._condition:
+            (error, self._error) = (self._error, None)
+        if error is not None:
+            raise error
+        return
+
+def _plain(value):
+    """ Converts NumPy values into types that BSON and JSON can store.
+    """
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {k : _plain(v) for k, v in value.items()}
+    return value
+
 class logger(object):
     """gives some basic logging functionality"""
 
@@ -39,6 +257,8 @@ class logger(object):
         if self.log_dir is not None and not os.path.isdir(self.log_dir):
             os.mkdir(self.log_dir)
         self.handlers = {}
+        self.writers = {}
+        self.log_files = params.get('log_files') or {}
         self.fout = None
         self.CreationInstant = time.time() if creationInstant is None else creationInstant
         
@@ -48,38 +268,91 @@ class logger(object):
         self.DB = None
         if dbURI is not None and dbName is not None:
             try:
+                from pymongo import MongoClient # Only needed with a database, decisions can go to a file.
                 client = MongoClient(dbURI)
                 self.DB = client[dbName]
             except:
                 self.DB = None
+
+        # Decisions are written in batches from a background thread, to a JSON lines file in
+        # log_dir when there is no database.
+        decisions = params.get('decisions') or {}
+        fallback = None
+        if self.log_dir is not None:
+            fallback = os.path.join(self.log_dir, decisions.get('fallback_file', 'decisions.jsonl'))
+        self.Decisions = None
+        if self.DB is not None or fallback is not None:
+            self.Decisions = DecisionSink(
+                self.DB.Decisions if self.DB is not None else None,
+                fallback if self.DB is None else None,
+                decisions.get('buffer_size', 256),
+                decisions.get('flush_interval', 1.0),
+                decisions.get('max_pending', 10000),
+                decisions.get('on_full', 'block'))
+        self._configLogged = False
         return
     
     @dbLogger
     def logConfig(self, config):
+        if self._configLogged:
+            return
         configObj = {
             'CreationTime' : self.CreationInstant
             }
         if not self.DB.Configs.find_one(configObj):
             configObj['Config'] = config
             self.DB.Configs.insert_one(configObj)
+        self._configLogged = True
 
         return
 
-    @dbLogger
     def logDecision(self, move_num, game_id, state, decision, probabilities, isTrianing, eval):
+        if self.Decisions is None:
+            return
         decisionObj = {
                 'CreationInstant' : self.CreationInstant,
                 'GameId' : game_id,
                 'MoveNum' : move_num,
-                'State' : state,
-                'Decision' : decision,
-                'Probabilities' : probabilities,
+                'State' : _plain(state),
+                'Decision' : _plain(decision),
+                'Probabilities' : _plain(probabilities),
                 'IsTraining' : isTrianing,
-                'NetworkEval' : eval
+                'NetworkEval' : _plain(eval)
             }
-        self.DB.Decisions.insert_one(decisionObj)
+        self.Decisions.Put(decisionObj)
+        return
+
+    def flush(self):
+        try:
+            if self.Decisions is not None:
+                self.Decisions.Flush()
+        finally:
+            for writer in self.writers.values():
+                writer.flush()
         return
 
+    def close(self):
+        (decisions, self.Decisions) = (self.Decisions, None)
+        try:
+            if decisions is not None:
+                decisions.Close()
+        finally:
+            for writer in self.writers.values():
+                writer.close()
+            self.writers = {}
+        return
+
+    def _writer(self, log_file):
+        """ Opens the writer that canLog keeps for log_file until close.
+        """
+        writer = LogWriter(os.path.join(self.log_dir, log_file),
+                           self.log_files.get('buffer_size', 65536),
+                           self.log_files.get('flush_interval', 5.0),
+                           self.log_files.get('max_bytes'),
+                           self.log_files.get('backups', 3))
+        self.writers[log_file] = writer
+        return writer
+
 
     #Local Logging
 
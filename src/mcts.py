@@ -1,7 +1,13 @@
 import numpy as np
 import time
 import multiprocessing as mp
+import threading
 from GameState import GameState
+from arraytree import ArrayTree
+from evaluator import EvaluationQueue, AsyncEvaluator
+from transposition import TranspositionTable
+from rollout import RolloutEngine
+from searchstats import SearchStats
 
 class Node:
     """ This is the abtract tree node class that is used to cache/organize
@@ -14,10 +20,14 @@ class Node:
         self.LegalActions = np.array(legalActions)
         self.Children = None
         self.Parent = None
-        # Use the legal actions mask to ignore priors that don't make sense.
-        self.Priors = np.multiply(priors, legalActions)
-
-        # Do some caching here. This is to reduce the strain on the CPU memory cache compared to receating a new array on every access.
+        self.Action = None
+        # Use the legal actions mask to ignore priors that don't make sense. Nodes created
+        # during an expansion get their priors once they are expanded themselves.
+        self.Priors = np.multiply(priors, legalActions) if priors is not None else None
+
+        # Statistics of the children, kept up to date by UpdateChild during the backprop so that
+        # selection never has to walk the children.
+        self._childValues = np.zeros(len(legalActions))
         self._childWinRates = np.zeros(len(legalActions))
         self._childPlays = np.zeros(len(legalActions))
         
@@ -25,33 +35,92 @@ class Node:
         return self.Value/self.Plays if self.Plays > 0 else 0
 
     def ChildProbability(self):
-        allPlays = sum(self.ChildPlays())
-        return self.ChildPlays()/allPlays if allPlays > 0 else np.array([0] * len(self.ChildPlays()))
+        """ Share of the playouts of every child, uniform over the legal
+            actions before the first playout.
+        """
+        allPlays = np.sum(self._childPlays)
+        if allPlays > 0:
+            return self._childPlays/allPlays
+        return self.LegalActions/np.sum(self.LegalActions) if np.any(self.LegalActions) else np.zeros(len(self._childPlays))
 
     def ChildWinRates(self):
-        for i in range(len(self.Children)):
-            if self.Children[i] is not None:
-                self._childWinRates[i] = self.Children[i].WinRate()
         return self._childWinRates
 
     def ChildPlays(self):
-        for i in range(len(self.Children)):
-            if self.Children[i] is not None:
-                self._childPlays[i] = self.Children[i].Plays
         return self._childPlays
 
+    def UpdateChild(self, action, value, plays = 1):
+        """ Adds a playout result to the statistics of one child.
+        """
+        self._childPlays[action] += plays
+        self._childValues[action] += value
+        p = self._childPlays[action]
+        self._childWinRates[action] = self._childValues[action]/p if p > 0 else 0
+        return
+
+    def Prune(self):
+        """ Drops the children, the node becomes a leaf that is expanded again
+            the next time the search reaches it.
+        """
+        self.Children = None
+        self._childValues[:] = 0
+        self._childWinRates[:] = 0
+        self._childPlays[:] = 0
+        return
+
 class MCTS:
     """ Base class for Monte Carlo Tree Search algorithms. Outlines all the 
         necessary operations for the core algorithm. Most operations will need
         to be overriden to avoid a NotImplemenetedError.
     """
-    def __init__(self, explorationRate, timeLimit = None, playLimit = None, threads = 1, **kwargs):
+    # Whether the leaf returned by FindLeaf is expanded with the priors of its own evaluation,
+    # so that the value and the priors of a leaf come from one evaluation.
+    ExpandLeaf = True
+
+    def __init__(self, explorationRate, timeLimit = None, playLimit = None, threads = 1, treeBackend = None, treeChunk = 4096, batchSize = 1, batchTimeout = None, parallelMode = 'root', virtualLoss = 1, transpositions = None, reuseLimit = None, rollouts = None, instrument = False, **kwargs):
         self.TimeLimit = timeLimit
         self.PlayLimit = playLimit
         self.ExplorationRate = explorationRate
         self.Root = None
+        self.LastAction = None
         self.Threads = threads
-        if self.Threads > 1:
+        self.BatchSize = batchSize if batchSize is not None else 1
+        self.BatchTimeout = batchTimeout
+
+        # 'root' searches independent trees in a process pool and merges them, 'tree' has
+        # several threads share one tree and one evaluator.
+        self.ParallelMode = parallelMode if parallelMode is not None else 'root'
+        self.VirtualLoss = virtualLoss
+        assert self.ParallelMode in ('root', 'tree'), 'Unknown parallel mode {}'.format(parallelMode)
+
+        # The 'array' backend keeps the tree in flat NumPy arrays instead of a Node per position.
+        self.Tree = None
+        if treeBackend == 'array':
+            assert self.Threads == 1 or self.ParallelMode == 'tree', 'The array tree backend does not support root parallel search.'
+            self.Tree = ArrayTree(treeChunk)
+        else:
+            assert treeBackend in (None, 'object'), 'Unknown tree backend {}'.format(treeBackend)
+
+        # Positions reached by different move orders share a node, turning the tree into a DAG.
+        self.Transpositions = None
+        if transpositions:
+            assert self.Tree is None, 'The array tree backend does not support transpositions.'
+            assert self.Threads == 1 or self.ParallelMode == 'tree', 'Root parallel search does not support transpositions.'
+            self.Transpositions = TranspositionTable(transpositions)
+
+        # Largest number of nodes kept from the previous search when the root moves, None keeps all of them.
+        self.ReuseLimit = reuseLimit
+
+        # Random playouts per leaf for the vectorized rollout engine, None plays one game per leaf on the states.
+        self.Rollouts = rollouts
+        self.RolloutEngine = None
+
+        # Timing of the search phases and a record of every move, see SearchStats.
+        self.Stats = None
+        if instrument:
+            self.Instrument(SearchStats())
+
+        if self.Threads > 1 and self.ParallelMode == 'root':
             self.Pool = mp.Pool(processes = self.Threads)
             
     def FindMove(self, state, temp, moveTime = None, playLimit = None):
@@ -71,25 +140,64 @@ class MCTS:
             playLimit = self.PlayLimit
 
         if self.Root is None:
-            self.Root = Node(state, state.LegalActions(), self.GetPriors(state))
+            self.Root = self._newRoot(state)
 
         assert self.Root.State == state, 'MCTS has been primed for the correct input state.'
         assert endTime is not None or playLimit is not None, 'The MCTS algorithm has a cutoff point.'
-        
+
+        stats = self.Stats
+        if stats is not None:
+            stats.StartMove(self.Root.Plays, self.TreeStats()['nodes'], self._cacheCounters())
+
         if self.Threads == 1:
             self._runMCTS(self.Root, temp, endTime, playLimit)
+        elif self.ParallelMode == 'tree':
+            self._runParallel(self.Root, temp, endTime, playLimit)
         elif self.Threads > 1:
             self._runAsynch(state, temp, endTime, playLimit)
 
+        if stats is not None:
+            stats.EndMove(self.Root.Plays, self.TreeStats()['nodes'], self._cacheCounters())
+
+        if self.Root.Children is None:
+            # The search stopped before the first playout, the move is picked from the legal ones.
+            self.AddChildren(self.Root)
+
         action = self._selectAction(self.Root, temp, exploring = False)
+        self.LastAction = action
 
         return self._applyAction(state, action), self.Root.WinRate(), self.Root.ChildProbability()
 
+    def Instrument(self, stats):
+        """ Records the time spent in selection, expansion, evaluation and
+            backprop, and a summary of every move, into stats. The methods of
+            the phases are wrapped on this instance only, so a search that is
+            not instrumented does not pay for it. None stops recording.
+        """
+        for name in _instrumented:
+            self.__dict__.pop(name, None)
+        self.Stats = stats
+        if stats is None:
+            return
+
+        self.FindLeaf = stats.Timed('selection', self.FindLeaf)
+        self.AddChildren = stats.Timed('expansion', self.AddChildren)
+        self.GetPriors = stats.Timed('evaluation', self.GetPriors)
+        self.SampleValuesAndPriors = stats.Timed('evaluation', self.SampleValuesAndPriors)
+        self.SampleValue = stats.Timed('evaluation', self.SampleValue)
+        self.SampleValues = stats.Timed('evaluation', self.SampleValues)
+        backProp = stats.Timed('backprop', self.BackProp)
+        def BackProp(path, stateValue, playerForValue):
+            stats.Depth(len(path) - 1)
+            return backProp(path, stateValue, playerForValue)
+        self.BackProp = BackProp
+        return
+
     def _runAsynch(self, state, temp, endTime = None, nPlays = None):
         roots = []
         results = []
         for i in range(self.Threads):
-            root = Node(state, state.LegalActions(), self.GetPriors(state))
+            root = Node(state, state.LegalActions(), None)
             results.append(self.Pool.apply_async(self._runMCTS, (root, temp, endTime, nPlays)))
 
         for r in results:
@@ -98,38 +206,145 @@ class MCTS:
         self._mergeAll(self.Root, roots)
         return
 
+    def _runParallel(self, root, temp, endTime = None, nPlays = None):
+        """ Tree parallel search. Every thread descends the same tree under a
+            lock and leaves a virtual loss on its path, so the threads spread
+            out over the tree while their leaves wait on the shared evaluator.
+            Leaves are evaluated outside of the lock and only expanded and
+            backed up under it once their value and priors are back.
+        """
+        lock = threading.Lock()
+        evaluator = AsyncEvaluator(self.SampleValuesAndPriors, self.BatchSize, self.BatchTimeout)
+        started = [0]
+        errors = []
+
+        def search():
+            try:
+                while True:
+                    with lock:
+                        if not ((endTime is None or (time.time() < endTime or root.Children is None)) \
+                                and (nPlays is None or started[0] < nPlays)):
+                            return
+                        started[0] += 1
+                        path = []
+                        node = self.FindLeaf(root, temp, path)
+                        state = node.State
+                        self._addVirtualLoss(path, self.VirtualLoss)
+
+                    (val, priors) = evaluator.Request(state, state.PreviousPlayer)
+
+                    with lock:
+                        self._addVirtualLoss(path, -self.VirtualLoss)
+                        # Another thread may have expanded the same leaf meanwhile.
+                        self._expandLeaf(node, path, priors)
+                        self.BackProp(path, val, state.PreviousPlayer)
+            except Exception as e:
+                errors.append(e)
+            return
+
+        evaluator.Start()
+        workers = [threading.Thread(target=search) for _ in range(self.Threads)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        evaluator.Stop()
+
+        if errors:
+            raise errors[0]
+        return root
+
     def _runMCTS(self, root, temp, endTime = None, nPlays = None):
         endPlays = root.Plays + (nPlays if nPlays is not None else 0)
+        queue = EvaluationQueue(self.SampleValuesAndPriors, self.BatchSize, self.BatchTimeout)
+        paths = {}
         while (endTime is None or (time.time() < endTime or root.Children is None)) \
                 and (nPlays is None or root.Plays < endPlays):
-            node = self.FindLeaf(root, temp)
+            path = []
+            node = self.FindLeaf(root, temp, path)
             
-            val = self.SampleValue(node.State, node.State.PreviousPlayer)
-            self.BackProp(node, val, node.State.PreviousPlayer)
+            if self.BatchSize == 1:
+                state = node.State
+                (val, priors) = self.SampleValuesAndPriors([state], [state.PreviousPlayer])[0]
+                self._expandLeaf(node, path, priors)
+                self.BackProp(path, val, state.PreviousPlayer)
+                continue
 
+            if node in queue:
+                # The virtual losses could not steer the search away from this leaf.
+                self._flushLeaves(queue, paths)
+                continue
+            # Pending leaves count as lost playouts so the next descents spread out.
+            self._addVirtualLoss(path, 1)
+            queue.Push(node, node.State, node.State.PreviousPlayer)
+            paths[node] = path
+            if queue.Ready():
+                self._flushLeaves(queue, paths)
+
+        self._flushLeaves(queue, paths)
         return root
 
+    def _flushLeaves(self, queue, paths):
+        for node, (val, priors) in queue.Flush():
+            path = paths.pop(node)
+            self._addVirtualLoss(path, -1)
+            self._expandLeaf(node, path, priors)
+            self.BackProp(path, val, node.State.PreviousPlayer)
+        return
+
+    def _expandLeaf(self, node, path, priors):
+        """ Expands a leaf returned by FindLeaf with the priors that came with
+            its value, unless it is terminal or has been expanded meanwhile.
+        """
+        if self.ExpandLeaf and node.Children is None and node.State.Winner(path[-1][1]) is None:
+            self.AddChildren(node, priors)
+        return
+
+    def _addVirtualLoss(self, path, plays):
+        """ Adds plays without any value along the path to a leaf, which
+            lowers the win rates the parents see for it. Use negative plays
+            to take the virtual loss back.
+        """
+        for i in range(len(path) - 1, 0, -1):
+            node, action = path[i]
+            node.Plays += plays
+            path[i - 1][0].UpdateChild(action, 0, plays)
+        path[0][0].Plays += plays
+        return
+
     def _mergeAll(self, target, trees):
-        for t in trees:
-            target.Plays += t.Plays
-            target.Value += t.Value
-        
-        continuedTrees = [t for t in trees if t.Children is not None]
-        if len(continuedTrees) == 0:
-            return
-        if target.Children is None:
-            t = continuedTrees[0]
-            target.Children = t.Children
-            t.Children = None
-            for c in target.Children:
-                if c is not None:
-                    c.Parent = target
-            del continuedTrees[0]
-
-        for i in range(len(target.Children)):
-            if target.Children[i] is None:
+        """ Adds the statistics of the trees searched by the pool to the
+            target tree, position by position.
+        """
+        stack = [(target, trees)]
+        while stack:
+            target, trees = stack.pop()
+            for t in trees:
+                target.Plays += t.Plays
+                target.Value += t.Value
+
+            continuedTrees = [t for t in trees if t.Children is not None]
+            if len(continuedTrees) == 0:
                 continue
-            self._mergeAll(target.Children[i], [t.Children[i] for t in continuedTrees])
+            for t in continuedTrees:
+                target._childPlays += t._childPlays
+                target._childValues += t._childValues
+            np.divide(target._childValues, target._childPlays, out=target._childWinRates, where=target._childPlays > 0)
+            if target.Children is None:
+                # The workers expanded the node with differently noised priors, the target gets their mean.
+                target.Priors = np.mean([t.Priors for t in continuedTrees], axis=0)
+                t = continuedTrees[0]
+                target.Children = t.Children
+                t.Children = None
+                for c in target.Children:
+                    if c is not None:
+                        c.Parent = target
+                del continuedTrees[0]
+
+            for i in range(len(target.Children)):
+                if target.Children[i] is None:
+                    continue
+                stack.append((target.Children[i], [t.Children[i] for t in continuedTrees]))
 
         return
 
@@ -141,35 +356,53 @@ class MCTS:
         """
         assert root.Children is not None, 'The node has children to select.'
         
+        plays = root.ChildPlays()
         if exploring:
-            allPlays = sum(root.ChildPlays())
-            upperConfidence = root.ChildWinRates() + self.ExplorationRate * root.Priors * np.sqrt(1.0 + allPlays) / (1.0 + root.ChildPlays())
-            return np.argmax(upperConfidence)
+            return np.argmax(root.ChildWinRates() + self.ExplorationRate * root.Priors * np.sqrt(1.0 + np.sum(plays)) / (1.0 + plays))
+        elif np.max(plays) == 0:
+            # Nothing has been searched yet, e.g. the time limit ran out at once.
+            legal = np.asarray(root.LegalActions, dtype = np.float64)
+            return np.random.choice(len(legal), p = legal / np.sum(legal))
         else:
-            allPlays = sum([p**(1/temp) for p in root.ChildPlays()])
-            nChildren = len(root.ChildPlays())
-            return np.random.choice(
-                range(nChildren), 
-                p=[c**(1/temp) / allPlays for c in root.ChildPlays()])
+            # Scaling by the most played child first keeps plays**(1/temp) finite for small temperatures.
+            weights = (plays / np.max(plays)) ** (1.0 / temp)
+            return np.random.choice(len(weights), p = weights / np.sum(weights))
 
-    def AddChildren(self, node):
-        """ Expands the node and adds children, actions and priors.
+    def AddChildren(self, node, priors = None):
+        """ Expands the node and adds children, actions and priors. The priors
+            are evaluated if they are not given.
         """
+        if priors is None:
+            priors = self.GetPriors(node.State)
+        if self.Tree is not None:
+            self.Tree.Expand(node.Id, node.LegalActions, priors)
+            return
+
+        node.Priors = np.multiply(priors, node.LegalActions)
         l = len(node.LegalActions)
         node.Children = [None] * l
         for i in range(l):
             if node.LegalActions[i] == 1:
                 s = self._applyAction(node.State, i)
-                node.Children[i] = Node(s, s.LegalActions(), self.GetPriors(s))
+                if self.Transpositions is not None:
+                    child = self.Transpositions.Get(s)
+                    if child is not None:
+                        node.Children[i] = child
+                        continue
+                node.Children[i] = Node(s, s.LegalActions(), None)
                 node.Children[i].Parent = node
+                node.Children[i].Action = i
+                if self.Transpositions is not None:
+                    self.Transpositions.Put(s, node.Children[i])
         return
 
     def MoveRoot(self, states):
         """ Function that is used to move the root of the tree to the next
             state. Use this to update the root so that tree integrity can be
-            maintained between moves if necessary.
+            maintained between moves if necessary. AdvanceRoot is cheaper
+            when the actions are known.
         """
-        for s in states: 
+        for s in states:
             self._moveRoot(s)
         return
 
@@ -179,15 +412,83 @@ class MCTS:
         if self.Root.Children is None:
             self.Root = None
             return
-        for child in self.Root.Children:
+        for action, child in enumerate(self.Root.Children):
             if child is None:
                 continue
             if child.State == state:
-                self.Root = child
-                break
+                self._advanceRoot(action)
+                return
+        self.DropRoot()
+        return
+
+    def AdvanceRoot(self, actions):
+        """ Moves the root down the tree by the given actions and frees
+            everything that is not below the new root, so the previous tree
+            cannot be gone back to.
+        """
+        for a in actions:
+            self._advanceRoot(a)
         return
 
+    def _advanceRoot(self, action):
+        if self.Root is None:
+            return
+        if self.Root.Children is None or self.Root.Children[action] is None:
+            self.DropRoot()
+            return
+
+        stats = self.Stats
+        if stats is not None:
+            before = self.TreeStats()['nodes']
+
+        child = self.Root.Children[action]
+        if self.Tree is not None:
+            self.Root = self.Tree.Reroot(child.Id, self.ReuseLimit)
+        else:
+            self.Root = self._detachSubtree(child)
+
+        if stats is not None:
+            stats.AdvanceRoot(before, self.TreeStats()['nodes'])
+        return
+
+    def _detachSubtree(self, root):
+        """ Cuts the subtree of root off the rest of the tree. Shared nodes are
+            reparented inside the subtree, the transposition table is rebuilt
+            from it, and past ReuseLimit nodes the rest is pruned.
+        """
+        root.Parent = None
+        root.Action = None
+        if self.Transpositions is not None:
+            self.Transpositions.Clear()
+            self.Transpositions.Put(root.State, root)
+
+        kept = {id(root)}
+        queue = [root]
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+            if node.Children is None:
+                continue
+            children = [c for c in node.Children if c is not None and id(c) not in kept]
+            if self.ReuseLimit is not None and len(kept) + len(children) > self.ReuseLimit:
+                node.Prune()
+                continue
+            for action, child in enumerate(node.Children):
+                if child is None or id(child) in kept:
+                    continue
+                kept.add(id(child))
+                child.Parent = node
+                child.Action = action
+                queue.append(child)
+                if self.Transpositions is not None:
+                    self.Transpositions.Put(child.State, child)
+        return root
+
     def ResetRoot(self):
+        """ Goes back to the root of the tree. Roots moved by MoveRoot or
+            AdvanceRoot have no parent anymore.
+        """
         if self.Root is None:
             return
         while self.Root.Parent is not None:
@@ -196,19 +497,61 @@ class MCTS:
 
     def DropRoot(self):
         self.Root = None
+        if self.Transpositions is not None:
+            self.Transpositions.Clear()
         return
 
-    def BackProp(self, leaf, stateValue, playerForValue):
-        leaf.Plays += 1
-        if leaf.Parent is not None:
-            if leaf.Parent.State.Player == playerForValue:
-                leaf.Value += stateValue
-            else:
-                leaf.Value += 1 - stateValue
-
-            self.BackProp(leaf.Parent, stateValue, playerForValue)
+    def TreeStats(self):
+        """ Reports the size of the current search tree. Byte counts are only
+            available for the array backend.
+        """
+        if self.Tree is not None:
+            return self.Tree.Stats()
+
+        # Illegal actions have no child, and nodes shared through transpositions count once.
+        seen = set()
+        stack = [self.Root] if self.Root is not None else []
+        while stack:
+            node = stack.pop()
+            if id(node) in seen:
+                continue
+            seen.add(id(node))
+            if node.Children is not None:
+                stack.extend(c for c in node.Children if c is not None)
+        stats = {'nodes' : len(seen), 'bytes_per_node' : None}
+        if self.Transpositions is not None:
+            stats['transpositions'] = self.Transpositions.Stats()
+        return stats
+
+    def _cacheCounters(self):
+        """ (hits, lookups) of the caches that spare the search work.
+        """
+        if self.Transpositions is None:
+            return (0, 0)
+        return (self.Transpositions.Hits, self.Transpositions.Hits + self.Transpositions.Misses)
+
+    def _newRoot(self, state):
+        if self.Tree is not None:
+            return self.Tree.NewRoot(state)
+        return Node(state, state.LegalActions(), None) # The priors come with the first evaluation.
+
+    def BackProp(self, path, stateValue, playerForValue):
+        """ Adds the value of a leaf to every node on the path recorded by
+            FindLeaf, from the leaf back to the root. With transpositions a
+            node can have several parents, the path decides which edges get
+            the playout.
+        """
+        otherValue = 1 - stateValue
+        parent = path[0][0]
+        parent.Plays += 1
+        for node, action in path[1:]:
+            value = stateValue if parent.State.Player == playerForValue else otherValue
+            node.Plays += 1
+            node.Value += value
+            parent.UpdateChild(action, value)
+            parent = node
         return
-    
+
     def _applyAction(self, state, action):
         s = state.Copy()
         s.ApplyAction(action)
@@ -227,6 +570,9 @@ class MCTS:
             Must return the value in [0, 1]
             Default is to randomly playout the game.
         """
+        if self.Rollouts is not None:
+            return self.SampleValues([state], [player])[0]
+
         rolloutState = state
         winner = rolloutState.Winner()
         while winner is None:
@@ -236,16 +582,48 @@ class MCTS:
             winner = rolloutState.Winner(action)
         return 0.5 if winner == 0 else int(player == winner)
 
+    def SampleValues(self, states, players):
+        """ Samples the values of a batch of states, each for its player.
+            Override this when evaluating states together is cheaper.
+        """
+        if self.Rollouts is not None and len(states) > 0:
+            cells = len(states[0].LegalActions())
+            if self.RolloutEngine is None or self.RolloutEngine.Cells != cells \
+                    or self.RolloutEngine.InARow != states[0].InARow:
+                self.RolloutEngine = RolloutEngine.ForState(states[0], self.Rollouts)
+            return list(self.RolloutEngine.Values(states, players))
+        return [self.SampleValue(s, p) for s, p in zip(states, players)]
+
+    def SampleValuesAndPriors(self, states, players):
+        """ Returns (value, priors) of a batch of leaves, the values as in
+            SampleValues. Override this when both come from one evaluation.
+        """
+        values = self.SampleValues(states, players)
+        return [(v, self.GetPriors(s)) for s, v in zip(states, values)]
+
     '''Must override these'''
-    def FindLeaf(self, node):
+    def FindLeaf(self, node, temp, path=None):
+        """ Descends from the node to the leaf that should be evaluated next
+            and returns it. (node, action) pairs from the node down to the
+            leaf are appended to path if one is given, the action being the
+            one taken by the previous node, for BackProp. With ExpandLeaf the leaf is returned
+            unexpanded, the search expands it once it has been evaluated.
+        """
         raise NotImplementedError
 
     '''Overriden from Object'''
     def __getstate__(self):
         self_dict = self.__dict__.copy()
         del self_dict['Pool']
+        # The pool workers search without instrumentation, the merged tree is recorded here.
+        for name in _instrumented:
+            self_dict.pop(name, None)
+        self_dict['Stats'] = None
         return self_dict
 
+# Methods that MCTS.Instrument replaces with timed versions.
+_instrumented = ('FindLeaf', 'AddChildren', 'GetPriors', 'SampleValue', 'SampleValues', 'SampleValuesAndPriors', 'BackProp')
+
 if __name__=='__main__':
     mcts = MCTS(1, np.sqrt(2))
     print(mcts.TimeLimit)
@@ -1,27 +1,46 @@
 import numpy as np
 import tensorflow as tf
+import itertools
 import os
+import time
+
+from symmetry import Permutations
+from npnetwork import NetworkName, ModelLoc
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'
 
 class Network:
-    def __init__(self, saver, tfLog, loadOld=False, dims=(3,3), **kwargs):
+    _ids = itertools.count()
+
+    def __init__(self, saver, tfLog, loadOld=False, dims=(3,3), frozen=None, **kwargs):
         self.parameters = kwargs['network']
         self.dims = dims
+        # (model_id, model_version) identifies the weights, e.g. for caching evaluations.
+        self.model_id = next(Network._ids)
+        self.model_version = 0
         gpu_options = tf.GPUOptions(per_process_gpu_memory_fraction=0.4)
-        self.sess = tf.Session(config=tf.ConfigProto(gpu_options=gpu_options))
-        
-        self.createNetwork()
-        self.init = tf.global_variables_initializer()
-        self.sess.run(self.init)
+        self.config = tf.ConfigProto(gpu_options=gpu_options)
         self.batch_count = 0
-        
-        self.saver = tf.train.Saver()
-        self.network_name = '{0}_{1}.ckpt'.format(self.parameters['blocks'], 
-            self.parameters['filters'])
-        self.model_loc = 'blackbird_models/best_model_{0}.ckpt'.format(self.network_name)
+
+        self.network_name = NetworkName(self.parameters, self.dims)
+        self.model_loc = ModelLoc(self.parameters, self.dims)
+        self.current_loc = 'blackbird_models/current_model_{0}.ckpt'.format(self.network_name)
+        self.frozen_loc = 'blackbird_models/frozen_model_{0}.pb'.format(self.network_name)
         self.writer_loc = 'blackbird_summary/model_summary'
 
+        self.frozen = frozen is not None
+        if self.frozen:
+            # Inference only, none of the training graph or its variables are built.
+            self.loadFrozen(frozen)
+            tfLog = False
+            loadOld = False
+        else:
+            self.sess = tf.Session(config=self.config)
+            self.createNetwork()
+            self.init = tf.global_variables_initializer()
+            self.sess.run(self.init)
+            self.saver = tf.train.Saver()
+
         self.default_alpha = self.parameters['policy']['dirichlet']['alpha']
         self.default_epsilon = self.parameters['policy']['dirichlet']['epsilon']
 
@@ -46,10 +65,43 @@ class Network:
     def createNetwork(self):
         """ Build out the policy/evaluation combo network
         """
+        self.actions = self.dims[0] * self.dims[1]
+
         with tf.variable_scope('inputs', reuse=tf.AUTO_REUSE) as scope:
-            self.input = tf.placeholder(shape=[None, self.dims[0], self.dims[1], 3], name='board_input', dtype=tf.float32)
-            self.correct_move_vec = tf.placeholder(shape=[None, self.dims[0] * self.dims[1]], name='correct_move_from_mcts', dtype=tf.float32)
-            self.mcts_evaluation = tf.placeholder(shape=[None], name='mcts_evaluation', dtype=tf.float32)
+            # Training examples are loaded into a dataset once per trainDataset call, which shuffles,
+            # batches and prefetches them in the graph. Feeding the inputs below bypasses it.
+            self.dataset_states = tf.placeholder(shape=[None, self.dims[0], self.dims[1], 3], name='dataset_states', dtype=tf.float32)
+            self.dataset_evaluations = tf.placeholder(shape=[None], name='dataset_evaluations', dtype=tf.float32)
+            self.dataset_policies = tf.placeholder(shape=[None, self.actions], name='dataset_policies', dtype=tf.float32)
+            self.dataset_batch_size = tf.placeholder(shape=[], name='dataset_batch_size', dtype=tf.int64)
+
+            dataset = tf.data.Dataset.from_tensor_slices((self.dataset_states, self.dataset_evaluations, self.dataset_policies))
+            dataset = dataset.shuffle(tf.size(self.dataset_evaluations, out_type=tf.int64))
+            dataset = dataset.batch(self.dataset_batch_size)
+            # Skip the leftover examples that do not fill a batch.
+            dataset = dataset.filter(lambda s, e, p: tf.equal(tf.shape(e, out_type=tf.int64)[0], self.dataset_batch_size))
+
+            # Minibatches made in Python, e.g. read from a ReplayBuffer, by trainBatches. Only the
+            # prefetched ones are held in memory instead of every example.
+            self.batch_generator = None
+            generated = tf.data.Dataset.from_generator(lambda: self.batch_generator, (tf.float32, tf.float32, tf.float32),
+                                                       ([None, self.dims[0], self.dims[1], 3], [None], [None, self.actions]))
+
+            if self.parameters['training'].get('augment', False):
+                dataset = dataset.map(self._augmentBatch)
+                generated = generated.map(self._augmentBatch)
+            prefetch = self.parameters['training'].get('prefetch', 2)
+            dataset = dataset.prefetch(prefetch)
+            generated = generated.prefetch(prefetch)
+
+            self.dataset_iterator = tf.data.Iterator.from_structure(dataset.output_types, dataset.output_shapes)
+            self.dataset_initializer = self.dataset_iterator.make_initializer(dataset)
+            self.generator_initializer = self.dataset_iterator.make_initializer(generated)
+            (next_states, next_evaluations, next_policies) = self.dataset_iterator.get_next()
+
+            self.input = tf.placeholder_with_default(next_states, shape=[None, self.dims[0], self.dims[1], 3], name='board_input')
+            self.correct_move_vec = tf.placeholder_with_default(next_policies, shape=[None, self.dims[0] * self.dims[1]], name='correct_move_from_mcts')
+            self.mcts_evaluation = tf.placeholder_with_default(next_evaluations, shape=[None], name='mcts_evaluation')
             
         with tf.variable_scope('hidden', reuse=tf.AUTO_REUSE) as scope:
             self.hidden = [self.input]
@@ -91,13 +143,18 @@ class Network:
             self.policy_conv = tf.layers.conv2d(self.hidden[-1],filters=2,kernel_size=(1,1),strides=1,name='convolution')
             self.policy_batch_norm = tf.layers.batch_normalization(self.policy_conv,name='batch_norm')
             self.policy_rectifier = tf.nn.relu(self.policy_batch_norm, name='rect_norm')
-            self.policy_dense = tf.layers.dense(self.policy_rectifier, units=9, activation=None, name='policy')
+            self.policy_dense = tf.layers.dense(self.policy_rectifier, units=self.actions, activation=None, name='policy')
             self.policy_vector = tf.reduce_sum(self.policy_dense, axis=[1,2])
             self.policy_base = tf.nn.softmax(self.policy_vector)
 
             self.dist = tf.distributions.Dirichlet([self.alpha[0], 1-self.alpha[0]])
-            self.policy = (1-self.epsilon[0])*self.policy_base + self.epsilon[0] * self.dist.sample([1,9])[0][:,0]
+            self.policy = (1-self.epsilon[0])*self.policy_base + self.epsilon[0] * self.dist.sample([1,self.actions])[0][:,0]
             self.policy /= tf.reduce_sum(self.policy)
+
+            # Same as above, but with noise and normalization per example so that it can be batched.
+            self.batch_noise = self.dist.sample([tf.shape(self.policy_base)[0], self.actions])[:, :, 0]
+            self.batch_policy = (1-self.epsilon[0])*self.policy_base + self.epsilon[0] * self.batch_noise
+            self.batch_policy /= tf.reduce_sum(self.batch_policy, axis=1, keepdims=True)
             
         with tf.variable_scope('loss', reuse=tf.AUTO_REUSE) as scope:
             self.loss_evaluation = tf.square(self.evaluation - self.mcts_evaluation)
@@ -123,19 +180,43 @@ class Network:
 
             self.training_op = self.optimizer.minimize(self.loss)
             
+    def _augmentBatch(self, states, evaluations, policies):
+        """ In graph version of symmetry.AugmentBatch.
+        """
+        perms = tf.constant(Permutations(self.dims[0]), dtype=tf.int32)
+        flatStates = tf.reshape(states, [-1, self.actions, 3])
+        states = tf.reshape(tf.transpose(tf.gather(flatStates, perms, axis=1), [1, 0, 2, 3]), [-1, self.dims[0], self.dims[1], 3])
+        policies = tf.reshape(tf.transpose(tf.gather(policies, perms, axis=1), [1, 0, 2]), [-1, self.actions])
+        evaluations = tf.tile(evaluations, [8])
+        return states, evaluations, policies
+
     def getEvaluation(self, state):
         """ Given a game state, return the network's evaluation.
         """
-        evaluation = self.sess.run(self.evaluation, feed_dict={self.input:state})
-        return evaluation[0]
+        return self.getEvaluationAndPolicy(state)[0][0]
     
     def getPolicy(self, state):
         """ Given a game state, return the network's policy.
             Random Dirichlet noise is applied to the policy output to ensure exploration, if training.
         """
-        policy = self.sess.run(self.policy, feed_dict={self.input:state, self.epsilon:[self.default_epsilon], self.alpha:[self.default_alpha]})
-        return policy[0]
+        return self.getEvaluationAndPolicy(state)[1][0]
+
+    def getEvaluationAndPolicy(self, states, noise=True):
+        """ Given a batch of game states, return the network's evaluations and
+            policies from a single run of the network.
+            Without noise the policies are the plain softmax of the network.
+        """
+        epsilon = self.default_epsilon if noise else 0
+        evaluations, policies = self.sess.run([self.evaluation, self.batch_policy],
+            feed_dict={self.input:states, self.epsilon:[epsilon], self.alpha:[self.default_alpha]})
+        return evaluations, policies
     
+    def getWeights(self, names):
+        """ Current values of the named variables, e.g. for NumpyNetwork.SetWeights.
+        """
+        values = self.sess.run([self.sess.graph.get_tensor_by_name(name + ':0') for name in names])
+        return dict(zip(names, values))
+
     def train(self, state, evaluation, policy, learning_rate=0.01):
         """ Train the network
         """
@@ -150,17 +231,133 @@ class Network:
         
         self.sess.run(self.training_op, feed_dict=feed_dict)
         self.batch_count += 1
+        self.model_version += 1
         if self.batch_count % 10 == 0 and self.write_summary:
             summary = self.sess.run(self.merged, feed_dict=feed_dict)
             self.writer.add_summary(summary, self.batch_count)
         
-    def saveModel(self):
+    def trainDataset(self, states, evaluations, policies, batch_size, learning_rate=0.01):
+        """ Train for one pass over the given examples in shuffled minibatches.
+            The arrays are copied into the graph once, so the training steps never wait on feed_dict.
+            Returns the number of steps.
+        """
+        self.sess.run(self.dataset_initializer, feed_dict={
+            self.dataset_states:states,
+            self.dataset_evaluations:evaluations,
+            self.dataset_policies:policies,
+            self.dataset_batch_size:batch_size
+        })
+        return self._trainSteps(learning_rate)
+
+    def trainBatches(self, batches, learning_rate=0.01):
+        """ Train on every (states, evaluations, policies) minibatch of an iterable, which is
+            read while the steps run, so the examples do not all have to fit in memory.
+            Returns the number of steps.
+        """
+        self.batch_generator = iter(batches)
+        self.sess.run(self.generator_initializer)
+        try:
+            return self._trainSteps(learning_rate)
+        finally:
+            self.batch_generator = None
+
+    def _trainSteps(self, learning_rate):
+        """ Run training steps until the initialized dataset is exhausted.
+        """
+        feed_dict={
+            self.learning_rate:[learning_rate],
+            self.epsilon:[self.default_epsilon],
+            self.alpha:[self.default_alpha]
+        }
+
+        steps = 0
+        start = time.time()
+        while True:
+            try:
+                if (self.batch_count + 1) % 10 == 0 and self.write_summary:
+                    # The summary has to come from the same run, another one would take the next batch.
+                    _, summary = self.sess.run([self.training_op, self.merged], feed_dict=feed_dict)
+                    self.writer.add_summary(summary, self.batch_count + 1)
+                else:
+                    self.sess.run(self.training_op, feed_dict=feed_dict)
+            except tf.errors.OutOfRangeError:
+                break
+            steps += 1
+            self.batch_count += 1
+            self.model_version += 1
+
+        elapsed = time.time() - start
+        if steps > 0 and self.write_summary:
+            summary = tf.Summary(value=[tf.Summary.Value(tag='training/steps_per_sec', simple_value=steps / elapsed)])
+            self.writer.add_summary(summary, self.batch_count)
+        return steps
+
+    def saveModel(self, loc=None):
         """ Write the state of the network to a file.
-            This should be reserved for "best" networks.
+            This should be reserved for "best" networks, unless another location is given.
+            The best network is exported as a frozen graph as well.
         """
-        self.saver.save(self.sess, self.model_loc)
-        
-    def loadModel(self):
+        assert not self.frozen, 'A frozen network cannot be saved.'
+        self.saver.save(self.sess, loc if loc is not None else self.model_loc)
+        if loc is None:
+            self.exportModel()
+
+    def exportModel(self, loc=None):
+        """ Write a frozen graph with only the inputs and the evaluation and policy heads,
+            with the weights turned into constants. Network(frozen=loc) loads it.
+        """
+        graph_def = self.sess.graph.as_graph_def()
+        for node in graph_def.node:
+            if node.name == self.input.op.name:
+                # Cut off the training dataset, the frozen graph is always fed.
+                node.op = 'Placeholder'
+                del node.input[:]
+
+        outputs = [self.evaluation.op.name, self.batch_policy.op.name]
+        graph_def = tf.graph_util.convert_variables_to_constants(self.sess, graph_def, outputs)
+        _renameNodes(graph_def, {
+            self.input.op.name:'frozen/board_input',
+            self.epsilon.op.name:'frozen/epsilon',
+            self.alpha.op.name:'frozen/alpha',
+            self.evaluation.op.name:'frozen/evaluation',
+            self.batch_policy.op.name:'frozen/policy'
+        })
+        with tf.gfile.GFile(loc if loc is not None else self.frozen_loc, 'wb') as f:
+            f.write(graph_def.SerializeToString())
+
+    def loadFrozen(self, loc=None):
+        """ Load a graph written by exportModel into a graph and session of its own.
+        """
+        graph_def = tf.GraphDef()
+        with tf.gfile.GFile(loc if loc is not None else self.frozen_loc, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+
+        graph = tf.Graph()
+        with graph.as_default():
+            (self.input, self.epsilon, self.alpha, self.evaluation, self.batch_policy) = tf.import_graph_def(
+                graph_def, name='', return_elements=['frozen/board_input:0', 'frozen/epsilon:0',
+                    'frozen/alpha:0', 'frozen/evaluation:0', 'frozen/policy:0'])
+        if getattr(self, 'sess', None) is not None:
+            self.sess.close()
+        self.sess = tf.Session(graph=graph, config=self.config)
+        self.saver = None
+        self.model_version += 1
+
+    def loadModel(self, loc=None):
         """ Load an old version of the network.
         """
-        self.saver.restore(self.sess, self.model_loc)
+        assert not self.frozen, 'A frozen network has no variables to restore, use loadFrozen.'
+        self.saver.restore(self.sess, loc if loc is not None else self.model_loc)
+        self.model_version += 1
+
+def _renameNodes(graph_def, names):
+    """ Rename nodes of a GraphDef in place, together with the inputs that refer to them.
+    """
+    for node in graph_def.node:
+        if node.name in names:
+            node.name = names[node.name]
+        for i, name in enumerate(node.input):
+            control = name.startswith('^')
+            (op, sep, port) = name.lstrip('^').partition(':')
+            if op in names:
+                node.input[i] = ('^' if control else '') + names[op] + sep + port
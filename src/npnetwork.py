@@ -0,0 +1,261 @@
+import numpy as np
+
+class NumpyNetwork(object):
+    """ Inference only copy of the network built in Network.createNetwork,
+        evaluated with NumPy. For our boards and networks a TF session run
+        costs much more than the math itself. Batch norm always runs in
+        inference mode, so it is folded into the weights of the convolution
+        before it. Weights come from a TF checkpoint, a running Network, or
+        an .npz file written by Save, and only the checkpoint needs TF.
+
+        The weights can be kept at reduced precision, see SetPrecision.
+    """
+    BatchNormEpsilon = 1e-3 # Default of tf.layers.batch_normalization.
+
+    def __init__(self, blocks, dims = (3, 3), alpha = 0.2, epsilon = 0.3):
+        self.Blocks = blocks
+        self.Dims = tuple(dims)
+        self.Actions = dims[0] * dims[1]
+        self.DirichletAlpha = alpha
+        self.DirichletEpsilon = epsilon
+        self.Weights = None
+        self.Version = None
+        self.Precision = 'float32'
+        self.CalibrationStates = None
+
+        self._layers = None
+        self._calibration = None
+
+    def Names(self):
+        """ Names of the variables in the TF graph that the network needs.
+        """
+        def layer(scope, conv, norm):
+            return ['{}/{}/{}'.format(scope, conv, v) for v in ('kernel', 'bias')] + \
+                ['{}/{}/{}'.format(scope, norm, v) for v in ('gamma', 'beta', 'moving_mean', 'moving_variance')]
+
+        names = layer('hidden/conv_block', 'conv', 'batch_norm')
+        for block in range(self.Blocks):
+            names += layer('hidden/block_{}'.format(block), 'conv_1', 'batch_norm_1')
+            names += layer('hidden/block_{}'.format(block), 'conv_2', 'batch_norm_2')
+        names += layer('evaluation', 'convolution', 'batch_norm')
+        names += ['evaluation/dense/kernel', 'evaluation/dense/bias']
+        names += layer('policy', 'convolution', 'batch_norm')
+        names += ['policy/policy/kernel', 'policy/policy/bias']
+        return names
+
+    def SetWeights(self, weights, version = None):
+        """ Takes a dict of variable name to array, as named in the TF graph.
+            version identifies the weights, see Network.model_version.
+        """
+        self.Weights = {name : np.asarray(weights[name], dtype = np.float32) for name in self.Names()}
+        self.Version = version
+
+        def fold(scope, conv, norm):
+            w = self.Weights
+            scale = w['{}/{}/gamma'.format(scope, norm)] / np.sqrt(w['{}/{}/moving_variance'.format(scope, norm)] + self.BatchNormEpsilon)
+            kernel = w['{}/{}/kernel'.format(scope, conv)] * scale
+            bias = (w['{}/{}/bias'.format(scope, conv)] - w['{}/{}/moving_mean'.format(scope, norm)]) * scale + w['{}/{}/beta'.format(scope, norm)]
+            # (height, width, in, out) -> (height * width * in, out), the column order of _conv.
+            return kernel.reshape((-1, kernel.shape[-1])), bias
+
+        # The dense layers of the heads act on every cell and are summed over
+        # the board afterwards, so Forward sums the cells first and the bias
+        # is added once per cell.
+        cells = self.Dims[0] * self.Dims[1]
+        self._layers = {'tower_0' : fold('hidden/conv_block', 'conv', 'batch_norm')}
+        for block in range(self.Blocks):
+            self._layers['block_{}_1'.format(block)] = fold('hidden/block_{}'.format(block), 'conv_1', 'batch_norm_1')
+            self._layers['block_{}_2'.format(block)] = fold('hidden/block_{}'.format(block), 'conv_2', 'batch_norm_2')
+        self._layers['evaluation'] = fold('evaluation', 'convolution', 'batch_norm')
+        self._layers['evaluation_dense'] = (self.Weights['evaluation/dense/kernel'].sum(axis = 1, keepdims = True),
+                                            cells * self.Weights['evaluation/dense/bias'].sum(keepdims = True))
+        self._layers['policy'] = fold('policy', 'convolution', 'batch_norm')
+        self._layers['policy_dense'] = (self.Weights['policy/policy/kernel'], cells * self.Weights['policy/policy/bias'])
+
+        if self.Precision != 'float32':
+            self._reducePrecision()
+            # Only needed again by Save and SetPrecision.
+            self.Weights = {name : w.astype(np.float16) for name, w in self.Weights.items()}
+        return
+
+    def SetPrecision(self, precision, calibrationStates = None):
+        """ 'float32' keeps full precision. 'float16' stores the weights in
+            half precision and computes in single precision. 'int8' quantizes
+            the kernels per output channel and the input of every layer with
+            a scale calibrated on the maximum it reaches over
+            calibrationStates, e.g. states from the replay buffer.
+        """
+        assert precision in ('float32', 'float16', 'int8'), 'Unknown precision {}'.format(precision)
+        assert precision != 'int8' or calibrationStates is not None, 'int8 needs states to calibrate on.'
+        self.Precision = precision
+        self.CalibrationStates = calibrationStates
+        if self.Weights is not None:
+            self.SetWeights(self.Weights, self.Version)
+        return
+
+    def Bytes(self):
+        """ Memory taken by the weights used for inference.
+        """
+        total = 0
+        for kernel, bias in self._layers.values():
+            total += bias.nbytes
+            total += kernel.Bytes() if isinstance(kernel, _Int8Kernel) else kernel.nbytes
+        return total
+
+    def _reducePrecision(self):
+        if self.Precision == 'float16':
+            self._layers = {name : (kernel.astype(np.float16), bias.astype(np.float16))
+                            for name, (kernel, bias) in self._layers.items()}
+            return
+
+        # Run the full precision layers once to find the range of their inputs.
+        self._calibration = {}
+        self.Forward(self.CalibrationStates)
+        (calibration, self._calibration) = (self._calibration, None)
+        self._layers = {name : (_Int8Kernel(kernel, calibration[name]), bias)
+                        for name, (kernel, bias) in self._layers.items()}
+        return
+
+    def LoadCheckpoint(self, loc):
+        import tensorflow as tf
+        reader = tf.train.NewCheckpointReader(loc)
+        self.SetWeights({name : reader.get_tensor(name) for name in self.Names()})
+        return
+
+    def Save(self, loc):
+        np.savez(loc, **self.Weights)
+        return
+
+    def Load(self, loc):
+        with np.load(loc) as weights:
+            self.SetWeights({name : weights[name] for name in self.Names()})
+        return
+
+    def Forward(self, states):
+        """ Returns the evaluations in [-1, 1] and the policies, without
+            exploration noise, of a batch of input arrays.
+        """
+        x = np.asarray(states, dtype = np.float32)
+
+        x = _relu(self._apply('tower_0', x))
+        for block in range(self.Blocks):
+            h = _relu(self._apply('block_{}_1'.format(block), x))
+            x = _relu(self._apply('block_{}_2'.format(block), h) + x)
+
+        e = _relu(self._apply('evaluation', x)).sum(axis = (1, 2))
+        evaluations = np.tanh(self._apply('evaluation_dense', e)[:, 0])
+
+        p = _relu(self._apply('policy', x)).sum(axis = (1, 2))
+        logits = self._apply('policy_dense', p)
+        logits -= logits.max(axis = 1, keepdims = True)
+        policies = np.exp(logits)
+        policies /= policies.sum(axis = 1, keepdims = True)
+        return evaluations, policies
+
+    def getEvaluationAndPolicy(self, states, noise = True):
+        """ Same as Network.getEvaluationAndPolicy, including the Dirichlet
+            noise on every policy unless noise is False.
+        """
+        evaluations, policies = self.Forward(states)
+        if noise:
+            policies = AddNoise(policies, self.DirichletAlpha, self.DirichletEpsilon)
+        return evaluations, policies
+
+    def _apply(self, name, x):
+        (kernel, bias) = self._layers[name]
+        if self._calibration is not None:
+            self._calibration[name] = max(self._calibration.get(name, 0), float(np.max(np.abs(x))))
+        if x.ndim == 4:
+            return _conv(x, kernel, bias)
+        return _matmul(x, kernel) + bias
+
+def NetworkName(parameters, dims):
+    """ Name of the checkpoints of a network, from the network parameters
+        and the board dimensions.
+    """
+    if tuple(dims) != (3, 3):
+        # Keep checkpoints for other board sizes apart, their policy heads have a different shape.
+        return '{0}_{1}_{2}x{3}.ckpt'.format(parameters['blocks'], parameters['filters'], dims[0], dims[1])
+    return '{0}_{1}.ckpt'.format(parameters['blocks'], parameters['filters'])
+
+def ModelLoc(parameters, dims):
+    """ Checkpoint of the best model, for Network and NumpyPlayer alike.
+    """
+    return 'blackbird_models/best_model_{0}.ckpt'.format(NetworkName(parameters, dims))
+
+def WeightsLoc(loc):
+    """ The .npz file that BlackBird.saveModel writes next to the checkpoint at loc.
+    """
+    return loc + '.npz'
+
+def AddNoise(policies, alpha, epsilon):
+    """ Mixes a batch of policies with the exploration noise of the network
+        and normalizes them again.
+    """
+    # Network samples Dirichlet([alpha, 1 - alpha]) per action and keeps the first component.
+    noise = np.random.beta(alpha, 1 - alpha, size = policies.shape)
+    policies = (1 - epsilon) * policies + epsilon * noise
+    return policies / policies.sum(axis = 1, keepdims = True)
+
+def ComparePrecision(network, states, precisions = ('float16', 'int8')):
+    """ Reports how far the outputs of each reduced precision are from the
+        full precision outputs of network on states, and the weight memory.
+        The int8 scales are calibrated on the same states.
+    """
+    (values, policies) = network.Forward(states)
+    report = {'float32' : {'bytes' : network.Bytes()}}
+    for precision in precisions:
+        reduced = NumpyNetwork(network.Blocks, network.Dims, network.DirichletAlpha, network.DirichletEpsilon)
+        reduced.SetPrecision(precision, states)
+        reduced.SetWeights(network.Weights, network.Version)
+        (reducedValues, reducedPolicies) = reduced.Forward(states)
+        report[precision] = {
+            'bytes' : reduced.Bytes(),
+            'value_max_error' : float(np.max(np.abs(values - reducedValues))),
+            'value_mean_error' : float(np.mean(np.abs(values - reducedValues))),
+            'policy_max_error' : float(np.max(np.abs(policies - reducedPolicies))),
+            'policy_kl' : float(np.mean(np.sum(policies * (np.log(policies + 1e-12) - np.log(reducedPolicies + 1e-12)), axis = 1))),
+            'top_move_agreement' : float(np.mean(np.argmax(policies, axis = 1) == np.argmax(reducedPolicies, axis = 1)))
+            }
+    return report
+
+class _Int8Kernel(object):
+    """ A kernel quantized to int8 with one scale per output channel. The
+        input is quantized with a fixed scale and the product accumulates in
+        int32 before it is scaled back.
+    """
+    def __init__(self, kernel, inputRange):
+        kernel = kernel.astype(np.float32)
+        self.Scales = np.maximum(np.max(np.abs(kernel), axis = 0), 1e-12) / 127
+        self.Kernel = np.round(kernel / self.Scales).astype(np.int8)
+        self.InputScale = max(inputRange, 1e-12) / 127
+        self.Shape = kernel.shape
+
+    def Dot(self, x):
+        quantized = np.clip(np.round(x / self.InputScale), -127, 127).astype(np.int32)
+        return quantized.dot(self.Kernel.astype(np.int32)) * (self.InputScale * self.Scales)
+
+    def Bytes(self):
+        return self.Kernel.nbytes + self.Scales.nbytes
+
+def _matmul(x, kernel):
+    if isinstance(kernel, _Int8Kernel):
+        return kernel.Dot(x).astype(np.float32)
+    return x.dot(kernel.astype(np.float32, copy = False))
+
+def _relu(x):
+    return np.maximum(x, 0, out = x)
+
+def _conv(x, kernel, bias):
+    """ 'same' convolution with stride 1 as a single matrix product. kernel
+        is (size * size * in, out) for a square kernel of odd size.
+    """
+    (n, h, w, c) = x.shape
+    size = int(round(np.sqrt(kernel.Shape[0] // c if isinstance(kernel, _Int8Kernel) else kernel.shape[0] // c)))
+    if size == 1:
+        return _matmul(x.reshape((n * h * w, c)), kernel).reshape((n, h, w, -1)) + bias
+    pad = size // 2
+    padded = np.pad(x, ((0, 0), (pad, pad), (pad, pad), (0, 0)), 'constant')
+    columns = np.concatenate([padded[:, i : i + h, j : j + w, :]
+                              for i in range(size) for j in range(size)], axis = 3)
+    return _matmul(columns.reshape((n * h * w, -1)), kernel).reshape((n, h, w, -1)) + bias
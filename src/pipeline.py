@@ -0,0 +1,230 @@
+import glob
+import multiprocessing as mp
+import os
+import queue
+import sys
+import time
+
+from arena import Arena, Promote
+from replay import ReplayBuffer
+
+class Pipeline(object):
+    """ Runs self-play, training and gating at the same time instead of one
+        after the other.
+
+        Self-play producers play games with the latest accepted model and put
+        them on a queue. The trainer appends them to the replay buffer, trains
+        on minibatches continuously and writes a candidate checkpoint every
+        checkpoint_steps steps. The gatekeeper plays every candidate against
+        the best model and promotes it if the SPRT accepts it, or if it wins
+        more than it loses when the test is undecided, after which the
+        producers reload the best model. Every stage reports its throughput
+        on a stats queue that the main process prints.
+    """
+    def __init__(self, parameters):
+        self.Parameters = parameters
+        self.PipelineParameters = parameters.get('pipeline')
+        self.Context = mp.get_context('spawn') # Forked TF sessions are not usable in the child.
+
+    def Run(self):
+        p = self.PipelineParameters
+        games = self.Context.Queue(maxsize = p.get('queue_size', 64))
+        candidates = self.Context.Queue()
+        stats = self.Context.Queue()
+        stop = self.Context.Event()
+        bestVersion = self.Context.Value('i', 0)
+        bestLock = self.Context.Lock()
+
+        stages = [self.Context.Process(target = _selfPlay, name = 'selfplay_{}'.format(i),
+                      args = (self.Parameters, games, stats, stop, bestVersion, bestLock))
+                  for i in range(p.get('producers', 1))]
+        stages.append(self.Context.Process(target = _train, name = 'trainer',
+                      args = (self.Parameters, games, candidates, stats, stop, bestLock)))
+        stages.append(self.Context.Process(target = _gate, name = 'gatekeeper',
+                      args = (self.Parameters, candidates, stats, stop, bestVersion, bestLock)))
+        for stage in stages:
+            stage.start()
+
+        totals = {}
+        start = time.time()
+        lastReport = start
+        interval = p.get('report_interval', 30)
+        failed = []
+        while any(stage.is_alive() for stage in stages):
+            try:
+                self._collect(totals, stats.get(timeout = 1))
+            except queue.Empty:
+                pass
+            if time.time() - lastReport >= interval:
+                lastReport = time.time()
+                self.Report(totals, lastReport - start)
+            failed = [stage for stage in stages if stage.exitcode not in (None, 0)]
+            if failed:
+                break
+
+        if failed:
+            # The other stages would wait on the failed one forever, stop them too.
+            stop.set()
+            candidates.put(None)
+            for stage in stages:
+                stage.join(p.get('shutdown_timeout', 30))
+                if stage.is_alive():
+                    stage.terminate()
+                    stage.join()
+
+        while not stats.empty():
+            self._collect(totals, stats.get())
+        self.Report(totals, time.time() - start)
+        if failed:
+            raise RuntimeError('Pipeline stage {} exited with code {}.'.format(failed[0].name, failed[0].exitcode))
+        return totals
+
+    def Report(self, totals, elapsed):
+        print('Pipeline throughput after {0:.0f}s:'.format(elapsed))
+        for stage in sorted(totals):
+            counts = totals[stage]
+            busy = counts.get('seconds', 0)
+            rates = ', '.join('{0} {1:.2f}/s'.format(k, v / busy if busy > 0 else 0)
+                              for k, v in sorted(counts.items()) if k != 'seconds')
+            print('  {0}: {1} ({2:.0%} busy)'.format(stage, rates, busy / elapsed if elapsed > 0 else 0))
+        return
+
+    def _collect(self, totals, stat):
+        counts = totals.setdefault(stat.pop('stage'), {})
+        for k, v in stat.items():
+            counts[k] = counts.get(k, 0) + v
+        return
+
+def _player(parameters):
+    """ A player for the stages that only search, without TF.
+    """
+    from player import NumpyPlayer
+    return NumpyPlayer(**parameters)
+
+def _network(parameters):
+    """ A player with the TF network, for the stages that train or save checkpoints.
+    """
+    from blackbird import BlackBird
+    return BlackBird(saver=False, tfLog=False, loadOld=False, **parameters)
+
+def _removeCheckpoint(loc):
+    """ Deletes the index, data and meta files of a checkpoint.
+    """
+    for path in glob.glob(glob.escape(loc) + '.*'):
+        os.remove(path)
+    return
+
+def _loadBest(player, stage):
+    """ Loads the best model into player and returns whether it could be read.
+        Call it holding bestLock, so the gatekeeper is not writing the model.
+    """
+    try:
+        player.loadModel()
+        return True
+    except Exception as e: # Missing or unreadable checkpoint files.
+        print('{0}: cannot load the best model {1}: {2!r}'.format(stage, player.model_loc, e), file = sys.stderr)
+        return False
+
+def _selfPlay(parameters, games, stats, stop, bestVersion, bestLock):
+    # Games still queued when the trainer stops are not needed, without this
+    # the producer would wait at exit for them to be read.
+    games.cancel_join_thread()
+    player = _player(parameters)
+    temp = parameters.get('mcts').get('temperature').get('exploration')
+    version = None
+    while not stop.is_set():
+        if version != bestVersion.value:
+            with bestLock:
+                current = bestVersion.value
+                if _loadBest(player, 'selfplay'):
+                    version = current
+                elif version is None:
+                    raise RuntimeError('Self-play has no model to play with.')
+                # Otherwise the previous model plays on and the load is tried again after the game.
+
+        start = time.time()
+        gameHistory = player.PlayGame(temp)
+        stats.put({'stage' : 'selfplay', 'games' : 1, 'examples' : len(gameHistory), 'seconds' : time.time() - start})
+
+        while not stop.is_set():
+            try:
+                games.put(gameHistory, timeout = 1)
+                break
+            except queue.Full:
+                pass
+    return
+
+def _train(parameters, games, candidates, stats, stop, bestLock):
+    p = parameters.get('pipeline')
+    trainer = _network(parameters)
+    with bestLock:
+        if not _loadBest(trainer, 'trainer'):
+            print('trainer: training starts from new weights.', file = sys.stderr)
+    replay = ReplayBuffer(parameters.get('selfplay').get('replay_dir') or 'replay',
+                          parameters.get('selfplay').get('replay_window'))
+
+    def ready():
+        return replay.Games() >= p.get('min_games', 1) and len(replay) >= trainer.batchSize
+
+    steps = 0
+    checkpointDir = os.path.dirname(trainer.current_loc)
+    while steps < p.get('train_steps') and not stop.is_set():
+        # Wait for enough games before the first step, then only take what has arrived.
+        while True:
+            try:
+                gameHistory = games.get(block = not ready(), timeout = 1)
+            except queue.Empty:
+                break
+            replay.Append(gameHistory)
+            stats.put({'stage' : 'trainer', 'games_ingested' : 1, 'seconds' : 0})
+        if not ready():
+            continue
+
+        start = time.time()
+        trainer._trainBatch(*replay.Sample(trainer.batchSize))
+        steps += 1
+        stats.put({'stage' : 'trainer', 'steps' : 1, 'seconds' : time.time() - start})
+
+        if steps % p.get('checkpoint_steps') == 0:
+            loc = os.path.join(checkpointDir, 'candidate_{0}_{1}'.format(steps, trainer.network_name))
+            trainer.saveModel(loc)
+            candidates.put(loc)
+
+    stop.set()
+    candidates.put(None)
+    return
+
+def _gate(parameters, candidates, stats, stop, bestVersion, bestLock):
+    temp = parameters.get('mcts').get('temperature').get('exploitation')
+    numGames = parameters.get('selfplay').get('selfplay_tests')
+    arenaParameters = parameters.get('arena') or {}
+    keeper = _network(parameters)
+
+    done = False
+    while not done:
+        loc = candidates.get()
+        if loc is None:
+            return
+        # Only the newest candidate is worth evaluating.
+        while not candidates.empty():
+            newer = candidates.get()
+            if newer is None:
+                done = True
+                break
+            _removeCheckpoint(loc)
+            loc = newer
+
+        start = time.time()
+        arena = Arena(parameters, loc, keeper.model_loc,
+                      arenaParameters.get('workers', 1), arenaParameters.get('sprt'))
+        (wins, draws, losses) = arena.PlayPrevious(temp, numGames)
+        promoted = Promote(arena.Decision, wins, losses)
+        if promoted:
+            with bestLock: # Producers must not read the best model while it is being replaced.
+                keeper.loadModel(loc)
+                keeper.saveModel()
+                bestVersion.value += 1
+        _removeCheckpoint(loc) # Kept as the best model if it was promoted.
+        stats.put({'stage' : 'gatekeeper', 'evaluations' : 1, 'promotions' : int(promoted),
+                   'games' : wins + draws + losses, 'seconds' : time.time() - start})
+    return
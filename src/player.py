@@ -0,0 +1,244 @@
+import itertools
+import os
+import numpy as np
+
+from DynamicMCTS import DynamicMCTS as MCTS
+from TicTacToe import BoardState
+from npnetwork import NumpyNetwork, AddNoise, ModelLoc, WeightsLoc
+from replay import ReplayBuffer
+from symmetry import InversePolicy
+from evalcache import EvaluationCache
+
+class Player(MCTS):
+    """ MCTS guided by the evaluations of a network, through an evaluation
+        cache. Subclasses provide the network with _inference: BlackBird
+        its TF session, NumpyPlayer NumPy weights without importing TF.
+    """
+    class TrainingExample(object):
+        def __init__(self, state, value, childValues, probabilities, priors):
+            self.State = state # state holds the player
+            self.Value = value
+            shape = (state.Size, state.Size)
+            self.ChildValues = childValues.reshape(shape) if childValues is not None else None
+            self.Reward = None
+            self.Priors = np.array(priors).reshape(shape)
+            self.Probabilities = probabilities
+            self.MoveNum = None
+            return
+
+        def __str__(self):
+            return '{}\nValue: {}\nChild Values:\n{}\nReward: {}\nProbabilites:\n{}\n\nPriors:\n{}\n'.format(
+                    str(self.State),
+                    str(self.Value),
+                    str(self.ChildValues),
+                    str(self.Reward), 
+                    str(self.Probabilities.reshape((self.State.Size, self.State.Size))),
+                    str(self.Priors)
+                    )
+
+    def __init__(self, **parameters):
+        self.bbParameters = parameters
+        self.canonicalize = parameters.get('mcts').get('canonicalize', False)
+
+        # The board of this instance, other instances in the process may play on other boards.
+        game = parameters.get('game') or {}
+        self.BoardSize = game.get('size', BoardState.Size)
+        self.InARow = game.get('inARow', BoardState.InARow)
+
+        MCTS.__init__(self, **parameters)
+
+        cache = parameters.get('network').get('cache', {})
+        self.EvalCache = EvaluationCache(cache.get('capacity', 4096), self.BoardSize * self.BoardSize,
+                                         cache.get('eviction', 'lru'))
+
+    def NewState(self):
+        """ The starting position on the board of this instance.
+        """
+        return BoardState(self.BoardSize, self.InARow)
+
+    def PlayGame(self, temp):
+        """ Plays one game against itself and returns its training examples.
+        """
+        gameHistory = []
+        state = self.NewState()
+        lastAction = None
+        winner = None
+        self.DropRoot()
+        while winner is None:
+            (nextState, v, currentProbabilties) = self.FindMove(state, temp)
+            childValues = self.Root.ChildWinRates()
+            example = self.TrainingExample(state, 1 - v, childValues, currentProbabilties, priors = self.Root.Priors)
+            state = nextState
+            self.AdvanceRoot([self.LastAction])
+
+            winner = state.Winner(lastAction)
+            gameHistory.append(example)
+            
+        example = self.TrainingExample(state, None, None, np.zeros([len(currentProbabilties)]), np.zeros([len(currentProbabilties)]))
+        gameHistory.append(example)
+        
+        for moveNum, example in enumerate(gameHistory):
+            example.MoveNum = moveNum
+            if winner == 0:
+                example.Reward = 0
+            else:
+                example.Reward = 1 if example.State.Player == winner else -1
+
+        return gameHistory
+
+    # Overriden from MCTS
+    def _cacheCounters(self):
+        (hits, lookups) = MCTS._cacheCounters(self)
+        return (hits + self.EvalCache.Hits, lookups + self.EvalCache.Hits + self.EvalCache.Misses)
+
+    def SampleValue(self, state, player):
+        value = self.Evaluate(state)[0] # Gets the value for the current player.
+        if state.Player != player:
+            value = 1 - value
+        assert value >= 0, 'Value: {}'.format(value) # Just to make sure Im not dumb :).
+        return value
+
+    def SampleValues(self, states, players):
+        return [value for value, _ in self.SampleValuesAndPriors(states, players)]
+
+    def SampleValuesAndPriors(self, states, players):
+        results = []
+        for state, player, (value, priors) in zip(states, players, self.EvaluateBatch(states)):
+            results.append((value if state.Player == player else 1 - value, priors))
+        return results
+
+    def GetPriors(self, state):
+        return self.Evaluate(state)[1]
+
+    def Evaluate(self, state):
+        """ Returns (value for the player to move in [0, 1], priors over the
+            legal actions) of a state. Both come from the same network run and
+            share one cache entry, the priors get fresh exploration noise.
+        """
+        return self.EvaluateBatch([state])[0]
+
+    def EvaluateBatch(self, states):
+        """ Evaluate for a list of states. States missing from the evaluation
+            cache are run through the network together. The cache holds the
+            policies without noise, so every lookup is noised independently.
+        """
+        if self.canonicalize:
+            # Symmetric positions share the cache entry of their canonical position.
+            canonical = [s.Canonical() for s in states]
+        else:
+            canonical = [(s, 0) for s in states]
+
+        version = (self.model_id, self.model_version)
+        # The stones themselves, not the Zobrist hash, so two positions can never share an entry.
+        keys = [(version, c.Bits) for c, _ in canonical]
+        results = [self.EvalCache.Get(k) for k in keys]
+
+        missing = [i for i in range(len(states)) if results[i] is None]
+        if missing:
+            evaluations, policies = self._inference().getEvaluationAndPolicy(
+                np.concatenate([canonical[i][0].AsInputArray() for i in missing], axis = 0), noise = False)
+            for i, evaluation, policy in zip(missing, evaluations, policies):
+                value = (evaluation + 1 ) * 0.5 # [-1, 1] -> [0, 1]
+                policy = policy * canonical[i][0].LegalActions()
+                total = np.sum(policy)
+                if total > 0: # Terminal states have no legal actions.
+                    policy /= total
+                self.EvalCache.Put(keys[i], value, policy)
+                results[i] = (value, policy)
+
+        policies = np.stack([InversePolicy(policy, transform, state.Size)
+                             for (_, policy), (_, transform), state in zip(results, canonical, states)])
+        policies = AddNoise(policies, self.default_alpha, self.default_epsilon) * np.stack([s.LegalActions() for s in states])
+        totals = policies.sum(axis = 1, keepdims = True)
+        np.divide(policies, totals, out = policies, where = totals > 0)
+        return [(value, policy) for (value, _), policy in zip(results, policies)]
+
+    def _calibrationStates(self):
+        """ Input arrays sampled from the replay buffer to calibrate int8
+            weights on, or None while it is still empty.
+        """
+        selfplay = self.bbParameters.get('selfplay')
+        replayDir = selfplay.get('replay_dir')
+        assert replayDir is not None, 'int8 precision calibrates on the replay buffer, set selfplay.replay_dir or use float16.'
+        if not os.path.isdir(replayDir):
+            return None # No games yet, the buffer is created where they are stored.
+        replay = ReplayBuffer(replayDir, selfplay.get('replay_window'))
+        if len(replay) == 0:
+            return None
+        count = min(len(replay), self.bbParameters.get('network').get('calibration_states', 256))
+        return replay.Sample(count)[0]
+
+    def _numpyNetwork(self):
+        """ A NumpyNetwork of the configured shape and precision, without weights.
+        """
+        network = self.bbParameters.get('network')
+        dirichlet = network['policy']['dirichlet']
+        numpyNetwork = NumpyNetwork(network['blocks'], (self.BoardSize, self.BoardSize),
+                                    dirichlet['alpha'], dirichlet['epsilon'])
+        if network.get('precision', 'float32') != 'int8':
+            numpyNetwork.SetPrecision(network.get('precision', 'float32'))
+        else:
+            self._calibrate(numpyNetwork)
+        return numpyNetwork
+
+    def _calibrate(self, numpyNetwork):
+        """ Calibrates int8 weights on new states from the replay buffer,
+            which changes along with the weights. Keeps the previous states,
+            or full precision, while the buffer is empty.
+        """
+        if self.bbParameters.get('network').get('precision', 'float32') != 'int8':
+            return
+        calibration = self._calibrationStates()
+        if calibration is not None:
+            numpyNetwork.SetPrecision('int8', calibration)
+        return
+
+    def _inference(self):
+        """ The network to evaluate states with, anything with getEvaluationAndPolicy.
+        """
+        raise NotImplementedError
+
+class NumpyPlayer(Player):
+    """ A Player that evaluates with a NumpyNetwork, for the processes that
+        only search: self-play and arena workers and pipeline producers.
+        loadModel reads the .npz that BlackBird.saveModel writes next to
+        every checkpoint, so TF is never imported.
+    """
+    _ids = itertools.count()
+
+    def __init__(self, **parameters):
+        Player.__init__(self, **parameters)
+        self.model_loc = ModelLoc(parameters.get('network'), (self.BoardSize, self.BoardSize))
+        # (model_id, model_version) identifies the weights, as for Network.
+        self.model_id = next(NumpyPlayer._ids)
+        self.model_version = 0
+        self.NumpyInference = self._numpyNetwork()
+        self.default_alpha = self.NumpyInference.DirichletAlpha
+        self.default_epsilon = self.NumpyInference.DirichletEpsilon
+
+    def loadModel(self, loc=None):
+        """ Loads the weights saved with the checkpoint at loc, the best model by default.
+        """
+        loc = loc if loc is not None else self.model_loc
+        self._calibrate(self.NumpyInference)
+        if os.path.isfile(WeightsLoc(loc)):
+            self.NumpyInference.Load(WeightsLoc(loc))
+        else:
+            # Checkpoints saved before the weights were written next to them need TF to read.
+            self.NumpyInference.LoadCheckpoint(loc)
+        self.model_version += 1
+        return
+
+    def _inference(self):
+        return self.NumpyInference
+
+# Self-play worker process state, see BlackBird._generateParallel.
+_selfPlayer = None
+
+def _initSelfPlayWorker(parameters, modelLoc):
+    global _selfPlayer
+    _selfPlayer = NumpyPlayer(**parameters)
+    _selfPlayer.loadModel(modelLoc)
+
+def _playSelfPlayGame(temp):
+    return _selfPlayer.PlayGame(temp)
@@ -0,0 +1,151 @@
+import json
+import os
+import numpy as np
+
+class ReplayBuffer(object):
+    """ Training examples stored on disk as fixed dtype NumPy arrays. Every
+        Append writes one shard of .npy files, which are read back memory
+        mapped, so sampling a minibatch only touches the rows it needs. Only
+        the last `window` games are used, and shards that fall out of the
+        window entirely are deleted.
+    """
+    _fields = ('states', 'policies', 'rewards', 'games', 'moves')
+
+    def __init__(self, directory, window = None):
+        self.Directory = directory
+        self.Window = window
+        self.NextGame = 0
+        self.Shards = []
+        self._arrays = {}
+
+        if not os.path.isdir(self.Directory):
+            os.makedirs(self.Directory)
+        indexFile = self._indexPath()
+        if os.path.isfile(indexFile):
+            with open(indexFile) as f:
+                index = json.load(f)
+            self.NextGame = index['next_game']
+            self.Shards = index['shards']
+
+    def Append(self, examples):
+        """ Adds the examples of one or more complete games. A new game starts
+            at every example with MoveNum 0.
+        """
+        if len(examples) == 0:
+            return
+
+        moves = np.array([e.MoveNum for e in examples], dtype=np.int32)
+        games = self.NextGame + np.cumsum(moves == 0, dtype=np.int64) - 1
+        assert moves[0] == 0, 'Examples have to start at the first move of a game.'
+
+        arrays = {
+            'states' : np.stack([e.State.AsInputArray()[0] for e in examples]).astype(np.int8),
+            'policies' : np.stack([e.Probabilities for e in examples]).astype(np.float32),
+            'rewards' : np.array([e.Reward for e in examples], dtype=np.int8),
+            'games' : games,
+            'moves' : moves
+            }
+
+        name = 'shard_{:08d}'.format(self.NextGame)
+        for field in self._fields:
+            np.save(self._shardPath(name, field), arrays[field])
+
+        self.Shards.append({
+            'name' : name,
+            'first_game' : int(games[0]),
+            'last_game' : int(games[-1]),
+            'size' : len(examples)
+            })
+        self.NextGame = int(games[-1]) + 1
+        self._trim()
+        self._writeIndex()
+        return
+
+    def Batches(self, batchSize, rng = np.random):
+        """ Yields (states, rewards, policies) minibatches that go over every
+            example in the window once, in random order. Leftover examples
+            that do not fill a batch are skipped, like in LearnFromExamples.
+        """
+        ranges = self._validRanges()
+        total = sum(end - start for _, start, end in ranges)
+        order = rng.permutation(total)
+        for i in range(total // batchSize):
+            yield self._gather(ranges, order[i * batchSize : (i + 1) * batchSize])
+        return
+
+    def Sample(self, batchSize, rng = np.random):
+        """ Returns one minibatch drawn uniformly from the window.
+        """
+        ranges = self._validRanges()
+        total = sum(end - start for _, start, end in ranges)
+        return self._gather(ranges, rng.choice(total, batchSize, replace = False))
+
+    def Games(self):
+        if not self.Shards:
+            return 0
+        return self.NextGame - self._minGame()
+
+    def __len__(self):
+        return sum(end - start for _, start, end in self._validRanges())
+
+    def _gather(self, ranges, rows):
+        rows = np.sort(rows) # Read the memory maps front to back.
+        offsets = np.cumsum([0] + [end - start for _, start, end in ranges])
+        shardIndices = np.searchsorted(offsets, rows, side = 'right') - 1
+
+        states, rewards, policies = [], [], []
+        for s in np.unique(shardIndices):
+            name, start, _ = ranges[s]
+            local = rows[shardIndices == s] - offsets[s] + start
+            states.append(self._array(name, 'states')[local])
+            rewards.append(self._array(name, 'rewards')[local])
+            policies.append(self._array(name, 'policies')[local])
+
+        return (np.concatenate(states).astype(np.float32),
+                np.concatenate(rewards).astype(np.float32),
+                np.concatenate(policies))
+
+    def _validRanges(self):
+        """ (shard, first row, end row) of the rows inside the window.
+        """
+        minGame = self._minGame()
+        ranges = []
+        for shard in self.Shards:
+            if shard['last_game'] < minGame:
+                continue
+            start = 0
+            if shard['first_game'] < minGame:
+                start = int(np.searchsorted(self._array(shard['name'], 'games'), minGame))
+            ranges.append((shard['name'], start, shard['size']))
+        return ranges
+
+    def _minGame(self):
+        if self.Window is None:
+            return 0
+        return max(0, self.NextGame - self.Window)
+
+    def _trim(self):
+        minGame = self._minGame()
+        for shard in [s for s in self.Shards if s['last_game'] < minGame]:
+            for field in self._fields:
+                self._arrays.pop((shard['name'], field), None)
+                os.remove(self._shardPath(shard['name'], field))
+            self.Shards.remove(shard)
+        return
+
+    def _array(self, name, field):
+        key = (name, field)
+        if key not in self._arrays:
+            self._arrays[key] = np.load(self._shardPath(name, field), mmap_mode = 'r')
+        return self._arrays[key]
+
+    def _writeIndex(self):
+        with open(self._indexPath(), 'w') as f:
+            json.dump({'next_game' : self.NextGame, 'shards' : self.Shards}, f)
+        return
+
+    def _indexPath(self):
+        return os.path.join(self.Directory, 'index.json')
+
+    def _shardPath(self, name, field):
+        return os.path.join(self.Directory, '{}_{}.npy'.format(name, field))
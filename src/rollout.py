@@ -0,0 +1,94 @@
+import time
+import numpy as np
+
+class RolloutEngine(object):
+    """ Plays random games to the end for a batch of k-in-a-row positions at
+        once. Every game is a row of a NumPy array, and the random move order
+        of a game is drawn up front as a shuffle of its empty cells, so each
+        ply is one step over all games that are still running. A move only
+        needs the lines through its cell checked, which are looked up in a
+        cell to line index.
+    """
+    def __init__(self, cells, lineCells, playouts = 16):
+        assert playouts > 0, 'Use a positive number of playouts per position.'
+        self.Cells = cells
+        self.InARow = lineCells.shape[1]
+        self.Playouts = playouts
+
+        # Lines through each cell, padded with a line that never counts.
+        lines = len(lineCells)
+        cellLines = [[] for _ in range(cells)]
+        for line, lineCell in enumerate(lineCells):
+            for cell in lineCell:
+                cellLines[cell].append(line)
+        width = max(1, max(len(l) for l in cellLines))
+        self.CellLines = np.full((cells, width), lines, dtype=np.int64)
+        for cell, l in enumerate(cellLines):
+            self.CellLines[cell, :len(l)] = l
+        self.CellLinesValid = self.CellLines < lines
+        self.LineMatrix = np.zeros((cells, lines + 1), dtype=np.int64)
+        for line, lineCell in enumerate(lineCells):
+            self.LineMatrix[lineCell, line] = 1
+
+        self.TotalPlayouts = 0
+        self.Seconds = 0
+
+    @classmethod
+    def ForState(cls, state, playouts = 16):
+        """ Engine for the board size and line length of a BoardState.
+        """
+        return cls(state.Size * state.Size, state.LineCells(), playouts)
+
+    def Values(self, states, players, playouts = None):
+        """ Returns, for each state, the average result of playouts random
+            games from it for the given player: 1 for a win, 0.5 for a draw
+            and 0 for a loss.
+        """
+        start = time.time()
+        playouts = playouts if playouts is not None else self.Playouts
+        batch = len(states)
+        games = batch * playouts
+
+        # One plane per player, the same for every playout of a state.
+        planes = np.stack([s.Board.reshape((self.Cells, 2)).T for s in states]).astype(np.int64)
+        counts = np.repeat(planes.dot(self.LineMatrix), playouts, axis = 0) # (games, player, line)
+        occupied = np.repeat(planes.sum(axis = 1) > 0, playouts, axis = 0)
+        empty = self.Cells - occupied.sum(axis = 1)
+
+        # Result of every game: 0 while running, otherwise the winner, or 3 for a draw.
+        results = np.repeat([s.Winner() or 0 for s in states], playouts).astype(np.int64)
+        toMove = np.repeat([s.Player - 1 for s in states], playouts)
+
+        # Shuffled empty cells first, occupied cells last.
+        keys = np.random.random((games, self.Cells))
+        keys[occupied] = 2
+        order = np.argsort(keys, axis = 1)
+
+        for ply in range(int(empty.max()) if games > 0 else 0):
+            running = np.where((results == 0) & (ply < empty))[0]
+            if len(running) == 0:
+                break
+            cells = order[running, ply]
+            player = (toMove[running] + ply) % 2
+            lines = self.CellLines[cells]
+            counts[running[:, None], player[:, None], lines] += 1
+            won = ((counts[running[:, None], player[:, None], lines] >= self.InARow) & self.CellLinesValid[cells]).any(axis = 1)
+            results[running[won]] = player[won] + 1
+
+        results[results == 0] = 3 # Boards filled up without a winner.
+        playersPerGame = np.repeat(players, playouts)
+        values = np.where(results == 3, 0.5, (results == playersPerGame).astype(np.float64))
+
+        self.TotalPlayouts += games
+        self.Seconds += time.time() - start
+        return values.reshape((batch, playouts)).mean(axis = 1)
+
+    def PlayoutsPerSecond(self):
+        return self.TotalPlayouts / self.Seconds if self.Seconds > 0 else 0
+
+    def Stats(self):
+        return {
+            'playouts' : self.TotalPlayouts,
+            'seconds' : self.Seconds,
+            'playouts_per_sec' : self.PlayoutsPerSecond()
+            }
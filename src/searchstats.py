@@ -0,0 +1,195 @@
+import bisect
+import csv
+import json
+import threading
+import time
+
+class SearchStats(object):
+    """ Counters and latency histograms of the phases of a search, and a
+        record of every move searched. MCTS.Instrument wraps the methods of
+        each phase so that their time is recorded, and a search without
+        SearchStats runs the plain methods.
+
+        Phase times are exclusive: the evaluation of the priors during an
+        expansion counts as evaluation and not as expansion.
+    """
+    Phases = ('selection', 'expansion', 'evaluation', 'backprop')
+
+    # Upper bucket edges in seconds, four per decade from 1us to 10s.
+    Buckets = [10 ** (e / 4) for e in range(-24, 5)]
+
+    def __init__(self):
+        self._lock = threading.Lock() # Tree parallel search records from several threads.
+        self._local = threading.local()
+        self.Reset()
+
+    def Reset(self):
+        with self._lock:
+            self.Calls = {p : 0 for p in self.Phases}
+            self.Seconds = {p : 0.0 for p in self.Phases}
+            self.SquaredSeconds = {p : 0.0 for p in self.Phases}
+            self.Max = {p : 0.0 for p in self.Phases}
+            self.Histograms = {p : [0] * (len(self.Buckets) + 1) for p in self.Phases}
+            self.Moves = []
+            self._move = None
+            self._pruned = 0
+        return
+
+    def Timed(self, phase, func):
+        """ Wraps func so that every call is recorded under phase. Calls made
+            from inside a call of the same phase are part of the outer one.
+        """
+        def timed(*args, **kwargs):
+            stack = self._local.__dict__.setdefault('stack', [])
+            if stack and stack[-1][0] == phase:
+                return func(*args, **kwargs)
+            frame = [phase, 0.0] # The phase and the time of the calls nested in it.
+            stack.append(frame)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                stack.pop()
+                if stack:
+                    stack[-1][1] += elapsed
+                self.Record(phase, elapsed - frame[1])
+        return timed
+
+    def Record(self, phase, seconds):
+        with self._lock:
+            self.Calls[phase] += 1
+            self.Seconds[phase] += seconds
+            self.SquaredSeconds[phase] += seconds * seconds
+            self.Max[phase] = max(self.Max[phase], seconds)
+            self.Histograms[phase][bisect.bisect_left(self.Buckets, seconds)] += 1
+        return
+
+    def Depth(self, depth):
+        """ Depth of a leaf reached during the current move.
+        """
+        move = self._move
+        if move is not None and depth > move['max_depth']:
+            move['max_depth'] = depth
+        return
+
+    def AdvanceRoot(self, before, after):
+        """ Nodes of the tree before and after the root moved down, the
+            nodes pruned are counted in the next move.
+        """
+        self._pruned += before - after
+        return
+
+    def StartMove(self, plays, nodes, cache):
+        """ plays is the number of playouts of the root before the search,
+            nodes the size of the tree kept from the previous moves, and
+            cache the (hits, lookups) of the caches of the search.
+        """
+        self._move = {'start' : time.perf_counter(), 'plays' : plays, 'reused_nodes' : nodes,
+                      'pruned_nodes' : self._pruned, 'cache' : cache, 'max_depth' : 0}
+        self._pruned = 0
+        return
+
+    def EndMove(self, plays, nodes, cache):
+        move = self._move
+        self._move = None
+        seconds = time.perf_counter() - move['start']
+        playouts = plays - move['plays']
+        record = {
+            'move' : len(self.Moves),
+            'playouts' : playouts,
+            'seconds' : seconds,
+            'playouts_per_sec' : playouts / seconds if seconds > 0 else 0,
+            'tree_nodes' : nodes,
+            'reused_nodes' : move['reused_nodes'],
+            'pruned_nodes' : move['pruned_nodes'],
+            'max_depth' : move['max_depth'],
+            'cache_hits' : cache[0] - move['cache'][0],
+            'cache_lookups' : cache[1] - move['cache'][1]
+            }
+        self.Moves.append(record)
+        return record
+
+    def Percentile(self, phase, q):
+        """ Upper edge of the histogram bucket holding the q quantile of the
+            phase latencies, or the largest latency for the last bucket.
+        """
+        histogram = self.Histograms[phase]
+        target = q * self.Calls[phase]
+        total = 0
+        for i, count in enumerate(histogram):
+            total += count
+            if count > 0 and total >= target:
+                return self.Buckets[i] if i < len(self.Buckets) else self.Max[phase]
+        return 0
+
+    def Summary(self):
+        moves = self.Moves
+        playouts = sum(m['playouts'] for m in moves)
+        seconds = sum(m['seconds'] for m in moves)
+        hits = sum(m['cache_hits'] for m in moves)
+        lookups = sum(m['cache_lookups'] for m in moves)
+        summary = {
+            'moves' : len(moves),
+            'playouts' : playouts,
+            'playouts_per_sec' : playouts / seconds if seconds > 0 else 0,
+            'tree_nodes' : sum(m['tree_nodes'] for m in moves) / len(moves) if moves else 0,
+            'reused_nodes' : sum(m['reused_nodes'] for m in moves) / len(moves) if moves else 0,
+            'pruned_nodes' : sum(m['pruned_nodes'] for m in moves),
+            'max_depth' : max([m['max_depth'] for m in moves] or [0]),
+            'cache_hits' : hits,
+            'cache_lookups' : lookups,
+            'cache_hit_rate' : hits / lookups if lookups > 0 else 0,
+            'phases' : {}
+            }
+        for p in self.Phases:
+            calls = self.Calls[p]
+            summary['phases'][p] = {
+                'calls' : calls,
+                'seconds' : self.Seconds[p],
+                'mean' : self.Seconds[p] / calls if calls > 0 else 0,
+                'p50' : self.Percentile(p, 0.5),
+                'p90' : self.Percentile(p, 0.9),
+                'p99' : self.Percentile(p, 0.99),
+                'max' : self.Max[p]
+                }
+        return summary
+
+    def WriteSummary(self, writer, step):
+        """ Adds the summary as scalars, and the phase latencies as
+            histograms, to a TF summary writer.
+        """
+        import tensorflow as tf
+        summary = self.Summary()
+        values = [tf.Summary.Value(tag='search/{}'.format(k), simple_value=summary[k])
+                  for k in ('playouts_per_sec', 'tree_nodes', 'reused_nodes', 'max_depth', 'cache_hit_rate')]
+        for p in self.Phases:
+            values.append(tf.Summary.Value(tag='search/{}_mean_ms'.format(p), simple_value=1000 * summary['phases'][p]['mean']))
+            if self.Calls[p] == 0:
+                continue
+            histogram = tf.HistogramProto(min=0, max=self.Max[p], num=self.Calls[p], sum=self.Seconds[p],
+                                          sum_squares=self.SquaredSeconds[p],
+                                          bucket_limit=self.Buckets + [1.7976931348623157e308], # DBL_MAX, as TF ends its buckets.
+                                          bucket=self.Histograms[p])
+            values.append(tf.Summary.Value(tag='search/{}_seconds'.format(p), histo=histogram))
+        writer.add_summary(tf.Summary(value=values), step)
+        return
+
+    def Save(self, path):
+        """ Writes the summary, the histograms and the moves as JSON, or only
+            the moves, one row each, to a path ending in .csv.
+        """
+        if path.endswith('.csv'):
+            with open(path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, ['move', 'playouts', 'seconds', 'playouts_per_sec', 'tree_nodes',
+                                            'reused_nodes', 'pruned_nodes', 'max_depth', 'cache_hits', 'cache_lookups'])
+                writer.writeheader()
+                writer.writerows(self.Moves)
+            return
+
+        with open(path, 'w') as f:
+            json.dump({'summary' : self.Summary(),
+                       'buckets' : self.Buckets,
+                       'histograms' : self.Histograms,
+                       'moves' : self.Moves}, f, indent=2)
+        return
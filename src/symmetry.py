@@ -0,0 +1,42 @@
+import numpy as np
+
+_permutations = {}
+
+def Permutations(size):
+    """ The 8 symmetries of a size x size board as an (8, size*size) array of
+        cell permutations. Transform t maps a flat board b to b[perms[t]], and
+        transform 0 is the identity.
+    """
+    if size not in _permutations:
+        cells = np.arange(size * size).reshape((size, size))
+        perms = []
+        for flip in (False, True):
+            board = np.fliplr(cells) if flip else cells
+            for k in range(4):
+                perms.append(np.rot90(board, k).ravel())
+        _permutations[size] = np.array(perms)
+    return _permutations[size]
+
+def InversePolicy(policy, transform, size):
+    """ Maps a policy over the cells of a transformed board back onto the
+        cells of the original board.
+    """
+    if transform == 0:
+        return policy
+    original = np.empty_like(policy)
+    original[Permutations(size)[transform]] = policy
+    return original
+
+def AugmentBatch(states, rewards, policies):
+    """ Returns the batch together with its 7 other symmetric copies. States
+        are (batch, size, size, planes) and policies (batch, size*size).
+    """
+    size = states.shape[1]
+    batch = states.shape[0]
+    perms = Permutations(size)
+
+    flatStates = states.reshape((batch, size * size, -1))
+    augmentedStates = flatStates[:, perms, :].transpose((1, 0, 2, 3)).reshape((8 * batch,) + states.shape[1:])
+    augmentedPolicies = policies[:, perms].transpose((1, 0, 2)).reshape((8 * batch, -1))
+    augmentedRewards = np.tile(rewards, 8)
+    return augmentedStates, augmentedRewards, augmentedPolicies
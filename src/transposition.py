@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+class TranspositionTable(object):
+    """ Bounded map from positions to search nodes, so that move orders which
+        reach the same position share one node. The least recently used
+        position is evicted once the table holds capacity entries; evicted
+        nodes stay in the tree, they just stop being shared.
+    """
+    def __init__(self, capacity):
+        assert capacity > 0, 'Transposition table capacity must be a positive integer.'
+        self.Capacity = capacity
+        self.Entries = OrderedDict()
+        self.Hits = 0
+        self.Misses = 0
+        self.Evictions = 0
+
+    def Get(self, state):
+        node = self.Entries.get(state)
+        if node is None:
+            self.Misses += 1
+            return None
+        self.Hits += 1
+        self.Entries.move_to_end(state)
+        return node
+
+    def Put(self, state, node):
+        self.Entries[state] = node
+        self.Entries.move_to_end(state)
+        if len(self.Entries) > self.Capacity:
+            self.Entries.popitem(last = False)
+            self.Evictions += 1
+        return
+
+    def Clear(self):
+        self.Entries.clear()
+        return
+
+    def HitRate(self):
+        lookups = self.Hits + self.Misses
+        return self.Hits / lookups if lookups > 0 else 0
+
+    def Stats(self):
+        """ Every hit is a node, and the evaluation of it, that the search did
+            not have to create again.
+        """
+        return {
+            'entries' : len(self.Entries),
+            'hits' : self.Hits,
+            'misses' : self.Misses,
+            'evictions' : self.Evictions,
+            'hit_rate' : self.HitRate()
+            }
+
+    def __len__(self):
+        return len(self.Entries)
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+@pytest.fixture
+def parameters():
+    """ parameters_template.yaml with a search small enough for tests.
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, 'parameters_template.yaml')) as param_file:
+        parameters = yaml.safe_load(param_file.read().strip())
+    parameters['mcts'].update({'playLimit' : 16, 'threads' : 1, 'batchSize' : 4, 'timeLimit' : None})
+    parameters['selfplay'].update({'workers' : 1, 'replay_dir' : None})
+    parameters['network'].update({'blocks' : 1, 'filters' : 4, 'backend' : 'tf', 'precision' : 'float32'})
+    return parameters
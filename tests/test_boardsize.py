@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from TicTacToe import BoardState
+from DynamicMCTS import DynamicMCTS
+
+Boards = [(3, 3), (5, 4), (7, 5)]
+
+@pytest.mark.parametrize('size, inARow', Boards)
+def test_state_encoding(size, inARow):
+    state = BoardState(size, inARow)
+    assert state.Size == size and state.InARow == inARow
+    assert len(state.LegalActions()) == size * size
+
+    state.ApplyAction(0)
+    state.ApplyAction(size * size - 1)
+    array = state.AsInputArray()
+    assert array.shape == (1, size, size, 3)
+    assert array[0, 0, 0, 0] == 1 and array[0, size - 1, size - 1, 1] == 1
+    assert array[0, :, :, :2].sum() == 2
+    assert (array[0, :, :, 2] == 1).all() # X to move.
+    assert state.LegalActions().sum() == size * size - 2
+
+    copy = state.Copy()
+    assert (copy.Size, copy.InARow) == (size, inARow)
+    assert copy == state
+
+@pytest.mark.parametrize('size, inARow', Boards)
+def test_winner_uses_the_line_length_of_the_state(size, inARow):
+    state = BoardState(size, inARow)
+    for i in range(inARow):
+        state.ApplyAction(i)                 # X along the first row.
+        if i < inARow - 1:
+            assert state.Winner(i) is None
+            state.ApplyAction(size + i)      # O along the second row.
+    assert state.Winner(inARow - 1) == 1
+    assert state.Winner() == 1
+    assert state.LineCells().shape[1] == inARow
+
+def test_states_of_different_sizes_coexist():
+    small = BoardState(3, 3)
+    large = BoardState(5, 4)
+    for action in (0, 3, 1, 4, 2):
+        small.ApplyAction(action)
+    for action in (0, 5, 1, 6, 2):
+        large.ApplyAction(action)
+    assert small.Winner() == 1
+    assert large.Winner() is None # Three in a row does not win with InARow 4.
+    assert len(large.LegalActions()) == 25 and len(small.LegalActions()) == 9
+    assert BoardState().Size == BoardState.Size
+
+@pytest.mark.parametrize('size, inARow', Boards[:2])
+def test_search_on_each_board(size, inARow):
+    np.random.seed(0)
+    mcts = DynamicMCTS(mcts = {'explorationRate' : 0.85, 'playLimit' : 50, 'rollouts' : 4})
+    state = BoardState(size, inARow)
+    (nextState, value, probabilities) = mcts.FindMove(state, 1)
+    assert probabilities.shape == (size * size,)
+    assert np.isclose(probabilities.sum(), 1)
+    assert nextState.Size == size and nextState.LegalActions().sum() == size * size - 1
+
+@pytest.mark.parametrize('size, inARow', Boards[:2])
+def test_network_heads(parameters, size, inARow):
+    tf = pytest.importorskip('tensorflow')
+    from network import Network
+    tf.reset_default_graph()
+    network = Network(False, False, dims = (size, size), **parameters)
+    states = np.stack([BoardState(size, inARow).AsInputArray()[0]] * 2)
+    (evaluations, policies) = network.getEvaluationAndPolicy(states)
+    assert evaluations.shape == (2,)
+    assert policies.shape == (2, size * size)
+    assert np.allclose(policies.sum(axis = 1), 1, atol = 1e-5)
+
+def test_training_examples_of_two_boards_in_one_process(parameters):
+    tf = pytest.importorskip('tensorflow')
+    from blackbird import BlackBird
+    players = []
+    for (size, inARow) in Boards[:2]:
+        tf.reset_default_graph()
+        parameters['game'] = {'size' : size, 'inARow' : inARow}
+        players.append(BlackBird(saver=False, tfLog=False, loadOld=False, **parameters))
+
+    # Playing on one board must not change the board of the other instance.
+    for player, (size, inARow) in zip(players, Boards[:2]):
+        examples = player.PlayGame(1)
+        assert examples[0].State.Size == size and examples[0].State.InARow == inARow
+        for e in examples:
+            assert e.State.AsInputArray().shape == (1, size, size, 3)
+            assert e.Probabilities.shape == (size * size,)
+            assert e.Reward in (-1, 0, 1)
+        for e in examples[:-1]:
+            assert e.ChildValues.shape == (size, size)
+            assert np.isclose(np.sum(e.Probabilities), 1)
@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+
+import pytest
+
+from logger import DecisionSink, LogWriter
+
+class StubCollection(object):
+    """ Records the batches of insert_many, or fails them with error.
+    """
+    def __init__(self, error = None):
+        self.Batches = []
+        self.Error = error
+        self.Lock = threading.Lock()
+
+    def insert_many(self, documents, ordered = True):
+        if self.Error is not None:
+            raise self.Error
+        with self.Lock:
+            self.Batches.append(list(documents))
+
+def waitFor(condition, timeout = 5):
+    end = time.time() + timeout
+    while not condition():
+        assert time.time() < end, 'Timed out.'
+        time.sleep(0.01)
+
+def readLines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def test_full_batches_are_written_without_a_flush(tmpdir):
+    path = str(tmpdir.join('decisions.jsonl'))
+    sink = DecisionSink(path = path, batchSize = 3, flushInterval = 60)
+    for i in range(3):
+        sink.Put({'i' : i})
+    waitFor(lambda: sink.Written == 3)
+    assert [d['i'] for d in readLines(path)] == list(range(3))
+
+    sink.Put({'i' : 3})
+    time.sleep(0.1)
+    assert sink.Stats()['pending'] == 1 and sink.Written == 3
+
+    sink.Flush()
+    assert [d['i'] for d in readLines(path)] == list(range(4))
+    sink.Close()
+
+def test_flush_and_close_write_what_is_pending():
+    collection = StubCollection()
+    sink = DecisionSink(collection, batchSize = 100, flushInterval = 60)
+    sink.Put({'i' : 0})
+    sink.Put({'i' : 1})
+    sink.Flush()
+    assert collection.Batches == [[{'i' : 0}, {'i' : 1}]]
+
+    sink.Put({'i' : 2})
+    sink.Close()
+    assert collection.Batches[-1] == [{'i' : 2}]
+    assert sink.Stats() == {'pending' : 0, 'written' : 3, 'dropped' : 0, 'failed' : 0}
+    with pytest.raises(AssertionError):
+        sink.Put({'i' : 3})
+
+def test_insert_errors_are_raised_by_flush_once():
+    error = RuntimeError('connection lost')
+    sink = DecisionSink(StubCollection(error), batchSize = 100, flushInterval = 60)
+    sink.Put({'i' : 0})
+    with pytest.raises(RuntimeError):
+        sink.Flush()
+    assert sink.Failed == 1 and sink.LastError is error
+    sink.Flush() # Reported already.
+    sink.Close()
+
+def test_serialization_errors_are_raised_by_close(tmpdir):
+    path = str(tmpdir.join('decisions.jsonl'))
+    sink = DecisionSink(path = path, batchSize = 100, flushInterval = 60)
+    sink.Put({'i' : 0})
+    sink.Put({'i' : object()})
+    with pytest.raises(TypeError):
+        sink.Close()
+    assert sink.Failed == 2
+    assert not tmpdir.join('decisions.jsonl').check() # Nothing of the bad batch is written.
+
+def test_documents_are_dropped_when_full():
+    collection = StubCollection()
+    sink = DecisionSink(collection, batchSize = 100, flushInterval = 60, maxPending = 2, onFull = 'drop')
+    for i in range(5):
+        sink.Put({'i' : i})
+    assert sink.Dropped == 3
+    sink.Close()
+    assert collection.Batches == [[{'i' : 0}, {'i' : 1}]]
+
+def test_an_idle_log_is_flushed_by_its_timer(tmpdir):
+    path = str(tmpdir.join('log.txt'))
+    writer = LogWriter(path, flushInterval = 0.1)
+    writer.write('line\n')
+    assert tmpdir.join('log.txt').size() == 0
+    waitFor(lambda: tmpdir.join('log.txt').size() == 5)
+    writer.close()
+
+def test_rotation_counts_bytes(tmpdir):
+    path = str(tmpdir.join('log.txt'))
+    writer = LogWriter(path, maxBytes = 8, backups = 1)
+    writer.write('\u00e9\u00e9\u00e9') # 3 characters, 6 bytes.
+    assert writer.Size == 6 and not tmpdir.join('log.txt.1').check()
+    writer.write('\u00e9')
+    assert tmpdir.join('log.txt.1').size() == 8 and writer.Size == 0
+    writer.close()
@@ -0,0 +1,20 @@
+import numpy as np
+
+from DynamicMCTS import DynamicMCTS
+from TicTacToe import BoardState
+
+def test_root_parallel_search_keeps_the_root_priors():
+    player = DynamicMCTS(mcts = {'explorationRate' : 0.85, 'playLimit' : 20, 'threads' : 2, 'parallelMode' : 'root'})
+    state = BoardState()
+    try:
+        player.FindMove(state, 1)
+        priors = player.Root.Priors
+        assert priors is not None and np.isclose(np.sum(priors), np.sum(state.LegalActions()))
+
+        # A second search goes on from the merged root.
+        plays = player.Root.Plays
+        player.FindMove(state, 1)
+        assert player.Root.Plays > plays
+    finally:
+        player.Pool.close()
+        player.Pool.join()
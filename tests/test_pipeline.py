@@ -0,0 +1,30 @@
+import multiprocessing as mp
+import time
+
+import pytest
+
+import pipeline
+
+def failingProducer(parameters, games, stats, stop, bestVersion, bestLock):
+    raise RuntimeError('producer crashed')
+
+def trainer(parameters, games, candidates, stats, stop, bestLock):
+    while not stop.is_set():
+        time.sleep(0.01)
+
+def gatekeeper(parameters, candidates, stats, stop, bestVersion, bestLock):
+    while candidates.get() is not None:
+        pass
+
+def test_a_failed_stage_stops_the_pipeline(monkeypatch):
+    monkeypatch.setattr(pipeline, '_selfPlay', failingProducer)
+    monkeypatch.setattr(pipeline, '_train', trainer)
+    monkeypatch.setattr(pipeline, '_gate', gatekeeper)
+    runner = pipeline.Pipeline({'pipeline' : {'producers' : 2, 'shutdown_timeout' : 5}})
+    runner.Context = mp.get_context('fork') # The stages are only patched in this process.
+
+    start = time.time()
+    with pytest.raises(RuntimeError, match = 'selfplay_'):
+        runner.Run()
+    assert time.time() - start < 10
+    assert not mp.active_children()
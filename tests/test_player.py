@@ -0,0 +1,127 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from npnetwork import NumpyNetwork, ModelLoc, WeightsLoc
+from player import NumpyPlayer
+from replay import ReplayBuffer
+
+def saveWeights(parameters, loc):
+    """ Random weights of the shapes createNetwork gives its variables,
+        saved as BlackBird.saveModel does next to a checkpoint at loc.
+    """
+    network = parameters['network']
+    size = parameters['game']['size']
+    filters = network['filters']
+    numpyNetwork = NumpyNetwork(network['blocks'], (size, size))
+    rng = np.random.RandomState(0)
+
+    weights = {}
+    for name in numpyNetwork.Names():
+        (scope, variable) = name.rsplit('/', 1)
+        if scope.startswith('hidden'):
+            (inputs, channels, kernel) = (3 if scope.startswith('hidden/conv_block') else filters, filters, 3)
+        elif scope == 'evaluation/dense':
+            (inputs, channels, kernel) = (1, network['eval']['dense'], None)
+        elif scope == 'policy/policy':
+            (inputs, channels, kernel) = (2, size * size, None)
+        else:
+            (inputs, channels, kernel) = (filters, 1 if scope.startswith('evaluation') else 2, 1)
+
+        if variable == 'kernel':
+            shape = (inputs, channels) if kernel is None else (kernel, kernel, inputs, channels)
+            weights[name] = rng.normal(scale = 0.3, size = shape)
+        elif variable in ('gamma', 'moving_variance'):
+            weights[name] = rng.uniform(0.5, 1.5, size = channels)
+        else:
+            weights[name] = rng.normal(scale = 0.1, size = channels)
+
+    numpyNetwork.SetWeights(weights)
+    numpyNetwork.Save(WeightsLoc(loc))
+    return numpyNetwork
+
+def test_numpy_player_evaluates_with_the_saved_weights(parameters, tmpdir):
+    loc = str(tmpdir.join('model.ckpt'))
+    network = saveWeights(parameters, loc)
+    player = NumpyPlayer(**parameters)
+    player.loadModel(loc)
+
+    state = player.NewState()
+    state.ApplyAction(4)
+    (value, priors) = player.Evaluate(state)
+    (evaluations, _) = network.Forward(state.AsInputArray())
+    assert np.isclose(value, (evaluations[0] + 1) / 2)
+    assert priors[4] == 0 and np.isclose(priors.sum(), 1)
+
+def test_numpy_player_plays_without_tensorflow(parameters, tmpdir):
+    loc = str(tmpdir.join('model.ckpt'))
+    saveWeights(parameters, loc)
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+    script = '\n'.join([
+        'import sys',
+        'sys.path.insert(0, {!r})'.format(src),
+        'from player import NumpyPlayer',
+        'player = NumpyPlayer(**{!r})'.format(parameters),
+        'player.loadModel({!r})'.format(loc),
+        'games = player.PlayGame(1)',
+        'assert games[-1].State.Winner() is not None',
+        "assert 'tensorflow' not in sys.modules"])
+    subprocess.check_call([sys.executable, '-c', script])
+
+def test_int8_calibration_follows_the_replay_buffer(parameters, tmpdir):
+    loc = str(tmpdir.join('model.ckpt'))
+    saveWeights(parameters, loc)
+    parameters['selfplay']['replay_dir'] = str(tmpdir.join('replay'))
+    parameters['network'].update({'precision' : 'int8', 'calibration_states' : 8})
+    player = NumpyPlayer(**parameters)
+    player.loadModel(loc)
+    assert player.NumpyInference.Precision == 'float32' # Nothing to calibrate on yet.
+
+    replay = ReplayBuffer(parameters['selfplay']['replay_dir'])
+    replay.Append(player.PlayGame(1))
+    player.loadModel(loc)
+    assert player.NumpyInference.Precision == 'int8'
+    first = player.NumpyInference.CalibrationStates
+    assert len(first) == min(8, len(replay))
+
+    replay.Append(player.PlayGame(1) + player.PlayGame(1))
+    player.loadModel(loc)
+    assert player.NumpyInference.CalibrationStates is not first
+    assert len(player.NumpyInference.CalibrationStates) == 8
+
+def test_numpy_player_loads_the_best_model_by_default(parameters, tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    tmpdir.mkdir('blackbird_models')
+    size = parameters['game']['size']
+    network = saveWeights(parameters, ModelLoc(parameters['network'], (size, size)))
+    player = NumpyPlayer(**parameters)
+    player.loadModel()
+    assert player.NumpyInference.Bytes() == network.Bytes()
+
+def test_numpy_player_loads_what_blackbird_saves(parameters, tmpdir, monkeypatch):
+    tf = pytest.importorskip('tensorflow')
+    from blackbird import BlackBird
+    monkeypatch.chdir(tmpdir)
+    tmpdir.mkdir('blackbird_models')
+    tf.reset_default_graph()
+    blackbird = BlackBird(saver=False, tfLog=False, loadOld=False, **parameters)
+    blackbird.saveModel()
+
+    player = NumpyPlayer(**parameters)
+    player.loadModel()
+    assert player.model_loc == blackbird.model_loc
+    states = np.concatenate([player.NewState().AsInputArray()] * 2)
+    (evaluations, policies) = player.NumpyInference.getEvaluationAndPolicy(states, noise = False)
+    (tfEvaluations, tfPolicies) = blackbird.getEvaluationAndPolicy(states, noise = False)
+    assert np.allclose(evaluations, tfEvaluations, atol = 1e-4)
+    assert np.allclose(policies, tfPolicies, atol = 1e-4)
+
+def test_int8_needs_a_replay_buffer(parameters, tmpdir, monkeypatch):
+    monkeypatch.chdir(tmpdir)
+    parameters['network']['precision'] = 'int8'
+    with pytest.raises(AssertionError, match = 'replay_dir'):
+        NumpyPlayer(**parameters)
+    assert tmpdir.listdir() == []